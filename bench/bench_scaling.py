@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Benchmark de escalamiento: genera archivos D4D sinteticos (d4d/synth.py) y mide tiempo y memoria de cada etapa.
+#   python bench/bench_scaling.py --scales 1e3 1e4 1e5 1e6
+#   python bench/bench_scaling.py --scales 1e5 --compare bench/baseline.jsonl
+# Cada medicion es una linea JSON en --out, para comparar corridas entre commits.
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from dateutil.relativedelta import relativedelta
+
+from d4d.cube import build_cube
+from d4d.data import ENCODING, SEP, df_clean, parse_d4d
+from d4d.figures import build_charts
+from d4d.followup import FollowUpIndex
+from d4d.simulator import df_dosis, scenario, scenario_grid
+from d4d.synth import generate
+
+fig_palette = ['#00857C', '#6ECEB2', '#0C2340', '#BFED33', '#FFF063', '#69B8F7', '#688CE8', '#5450E4']
+# la lectura con pandas + df_clean (camino anterior) solo se mide hasta esta escala
+LEGACY_MAX_ROWS = 10_000_000
+RSS_SAMPLE_S = .005
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def measure(fn):
+    # dos pasadas de la misma etapa: una de memoria y otra cronometrada sin tracemalloc ni muestreo, que
+    # multiplican el tiempo de las etapas en python puro. ru_maxrss es el maximo de todo el proceso (incluye
+    # etapas y escalas anteriores): la memoria de la etapa es el delta sobre el RSS de antes, muestreado durante la etapa
+    stats = memory(fn)
+    t = time.perf_counter()
+    result = fn()
+    return result, {'seconds': round(time.perf_counter() - t, 6), **stats}
+
+
+def memory(fn):
+    rss0 = rss_mb()
+    peak = [rss0]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(RSS_SAMPLE_S):
+            peak[0] = max(peak[0], rss_mb())
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    tracemalloc.start()
+    arrow0 = pa.total_allocated_bytes()
+    try:
+        # el resultado se descarta al salir: la pasada cronometrada arma el suyo
+        result = fn()
+        _, py_peak = tracemalloc.get_traced_memory()
+        arrow = pa.total_allocated_bytes() - arrow0
+        rss1 = rss_mb()
+        del result
+    finally:
+        tracemalloc.stop()
+        done.set()
+        sampler.join()
+    return {
+        'py_peak_mb': round(py_peak/2**20, 3),
+        'arrow_mb': round(arrow/2**20, 3),
+        'rss_delta_mb': round(rss1 - rss0, 1),
+        'rss_peak_delta_mb': round(max(peak[0], rss1) - rss0, 1),
+    }
+
+
+def legacy_tracking(df, periodo):
+    periodo_dt = datetime.date(int(periodo[:4]), int(periodo[4:]), 1)
+    seg2 = df[(df.dosis=='1ra')&(df.fecha>=str(periodo_dt-relativedelta(months=2)))&(df.fecha<str(periodo_dt-relativedelta(months=1)))]
+    seg3 = df[(df.dosis=='2da')&(df.fecha>=str(periodo_dt-relativedelta(months=4)))&(df.fecha<str(periodo_dt-relativedelta(months=3)))]
+    return len(seg2), len(seg3)
+
+
+def run_scale(path, rows):
+    # las dos lecturas parten de la ruta: ambas incluyen el I/O del archivo
+    stages = []
+    if rows <= LEGACY_MAX_ROWS:
+        stages.append(('read_csv+df_clean', lambda: df_clean(pd.read_csv(path, encoding=ENCODING, sep=SEP))))
+    stages.append(('load', lambda: parse_d4d(path)))
+    out = []
+    for name, fn in stages:
+        # solo se conserva el resultado de la ultima etapa (load), para no inflar el RSS de las siguientes
+        df, stats = measure(fn)
+        out.append((name, stats))
+    cube, stats = measure(lambda: build_cube(df))
+    out.append(('cube', stats))
+    later = [
+        ('df_charts', lambda: build_charts(cube, fig_palette)),
+        ('df_dosis', lambda: df_dosis(df)),
+        ('simulator_tables', lambda: scenario(df_dosis(df)[::2], 130000, 89500, .03, .8, .7)),
+        ('simulator_grid_10k', lambda: scenario_grid(df_dosis(df)[::2], 130000, 89500, .03, np.linspace(0, 1, 101), np.linspace(0, 1, 101))),
+    ]
+    for name, fn in later:
+        out.append((name, measure(fn)[1]))
+    index, stats = measure(lambda: FollowUpIndex(df))
+    out.append(('tracking_index', stats))
+    periodos = list(index.periodos)
+    _, stats = measure(lambda: [index.due_rows(df, p) for p in periodos])
+    stats['seconds'] = round(stats['seconds']/len(periodos), 6)
+    out.append(('tracking_lookup', stats))
+    out.append(('tracking_legacy_lookup', measure(lambda: legacy_tracking(df, periodos[len(periodos)//2]))[1]))
+    return out
+
+
+def git_rev():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(records, baseline_path):
+    base = pd.read_json(baseline_path, lines=True)
+    base = base[base.run == base.run.max()].set_index(['rows', 'stage']).seconds
+    cur = pd.DataFrame(records).set_index(['rows', 'stage']).seconds
+    table = pd.DataFrame({'baseline_s': base, 'current_s': cur}).dropna()
+    table['ratio'] = (table.current_s/table.baseline_s).round(2)
+    print(table.to_string())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time and memory of each stage at several data scales')
+    parser.add_argument('--scales', nargs='+', type=float, default=[1e3, 1e4, 1e5, 1e6])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=str(Path(tempfile.gettempdir()) / 'd4d_bench'))
+    parser.add_argument('--out', default=str(ROOT / 'bench' / 'results.jsonl'))
+    parser.add_argument('--compare', default=None, help='previous results file; compares against its latest run')
+    args = parser.parse_args(argv)
+    Path(args.data_dir).mkdir(parents=True, exist_ok=True)
+    run = datetime.datetime.now().isoformat(timespec='seconds')
+    meta = {'run': run, 'git': git_rev(), 'python': platform.python_version(), 'pandas': pd.__version__, 'pyarrow': pa.__version__}
+    records = []
+    for scale in args.scales:
+        rows = int(scale)
+        path = Path(args.data_dir) / f'synth_{rows}_{args.seed}.csv'
+        if not path.exists():
+            generate(path, rows, args.seed)
+        for stage, stats in run_scale(path, rows):
+            record = {**meta, 'rows': rows, 'stage': stage, **stats}
+            records.append(record)
+            print(f"{rows:>12,} {stage:<24} {stats['seconds']:>10.4f}s {stats['py_peak_mb']:>9.1f}MB py {stats['arrow_mb']:>9.1f}MB arrow {stats['rss_peak_delta_mb']:>9.1f}MB rss")
+    with open(args.out, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+    if args.compare:
+        compare(records, args.compare)
+
+
+if __name__ == '__main__':
+    main()
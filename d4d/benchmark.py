@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from d4d.cube import file_cube
+from d4d.data import FrameCache, source_digest
+from d4d.mapped import mapped
+
+### BENCHMARK REGIONAL ###
+# cada observacion es una comuna en un mes; los percentiles se precalculan a nivel nacional,
+# por region y por comuna, y un perfil se ubica con una interpolacion sobre esa grilla
+QS = np.linspace(0, 1, 101)
+SCOPES = ['national', 'region', 'comuna']
+MIX_DIMS = ['sexo', 'edad', 'especialidad']
+
+_benchmarks = FrameCache(max_bytes=64 * 1024 * 1024)
+
+
+def profile_metrics(cube, by):
+    # adherencia (2da/1ra, 3ra/1ra) y mezcla de sexo, edad y especialidad por grupo
+    by = list(by)
+    total = cube.groupby(by, observed=True).cantidad.sum()
+    dosis = cube.groupby(by + ['dosis'], observed=True).cantidad.sum().unstack('dosis').reindex(columns=['1ra', '2da', '3ra']).fillna(0)
+    d1 = dosis['1ra'].where(dosis['1ra'] > 0)
+    metrics = [(dosis['2da']/d1).rename('adh2'), (dosis['3ra']/d1).rename('adh3')]
+    for dim in MIX_DIMS:
+        mix = cube.groupby(by + [dim], observed=True).cantidad.sum().unstack(dim).fillna(0)
+        mix = mix.div(total, axis=0)
+        mix.columns = [f'{dim}_{c}' for c in mix.columns]
+        metrics.append(mix)
+    return pd.concat(metrics, axis=1).reindex(total.index)
+
+
+def build_benchmark(cube):
+    obs = profile_metrics(cube, ['region', 'comuna', 'mes']).reset_index()
+    metrics = [c for c in obs.columns if c not in ('region', 'comuna', 'mes')]
+    # mezcla: si la observacion no tiene esa categoria el share es 0, no faltante
+    mix = [c for c in metrics if c not in ('adh2', 'adh3')]
+    obs[mix] = obs[mix].fillna(0)
+    parts = []
+    for scope in SCOPES:
+        groups = obs.assign(national='all').groupby(scope, observed=True)[metrics]
+        q = groups.quantile(QS)
+        q.index = q.index.set_names(['key', 'q'])
+        parts.append(q.reset_index().assign(scope=scope, n=lambda x, g=groups.size(): x.key.map(g).to_numpy()))
+    bench = pd.concat(parts, ignore_index=True)
+    bench['key'] = bench.key.astype(str)
+    return bench.set_index(['scope', 'key', 'q']).sort_index()
+
+
+def load_benchmark(source):
+    # percentiles del archivo de referencia nacional, calculados una vez por contenido
+    key = source_digest(source)
+    bench = _benchmarks.get(key)
+    if bench is None:
+        bench = mapped('benchmark', key, lambda: build_benchmark(file_cube(source)))
+        _benchmarks.put(key, bench)
+    return bench
+
+
+def place(bench, profiles, scope, keys=None):
+    # percentil (0-100) de cada perfil dentro de la distribucion del scope; profiles: una fila por clinica
+    metrics = [c for c in bench.columns if c != 'n' and c in profiles.columns]
+    keys = pd.Series('all' if scope == 'national' else keys, index=profiles.index).astype(str)
+    out = pd.DataFrame(np.nan, index=profiles.index, columns=metrics)
+    for key, idx in keys.groupby(keys).groups.items():
+        if (scope, key) not in bench.index:
+            continue
+        grid = bench.loc[(scope, key)]
+        for col in metrics:
+            values = grid[col].to_numpy()
+            ok = ~np.isnan(values)
+            if ok.any():
+                out.loc[idx, col] = np.interp(profiles.loc[idx, col].to_numpy(dtype=float), values[ok], QS[ok])*100
+    return out
+
+
+def benchmark_table(bench, cube):
+    # perfil de una clinica frente al pais y a su region (la region con mas dosis en sus datos)
+    region = cube.groupby('region', observed=True).cantidad.sum().idxmax()
+    # misma unidad que la referencia (una comuna en un mes): el perfil es el mes mediano de la clinica,
+    # no su periodo completo, que suaviza las mezclas y sesga el percentil
+    monthly = profile_metrics(cube.assign(clinic='you'), ['clinic', 'mes'])
+    mix = [c for c in monthly.columns if c not in ('adh2', 'adh3')]
+    monthly[mix] = monthly[mix].fillna(0)
+    profile = monthly.median().to_frame('you').T
+    table = profile.T.rename(columns={'you': 'Your value'}).rename_axis(columns=None)
+    table['National percentile'] = place(bench, profile, 'national').T['you']
+    table['Regional percentile'] = place(bench, profile, 'region', region).T['you']
+    return table.dropna(subset=['Your value']), region
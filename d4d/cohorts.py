@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+from scipy.optimize import nnls
+
+from d4d.followup import month_to_periodo
+
+### COHORTES ###
+# cohorte = mes de la 1ra dosis. El D4D no trae identificador de paciente: las 2das y 3ras dosis de cada mes se
+# reparten entre las cohortes del segmento dentro del desfase maximo, con pesos = perfil de desfase x 1ras dosis
+# de la cohorte (dosis esperadas), sin pasar lo que le queda a cada cohorte. El perfil se ajusta a los propios
+# datos (modelo de rezagos distribuidos, minimos cuadrados no negativos). Es una estimacion, no una medicion.
+# Las filas se ordenan y agrupan una sola vez en un arreglo denso (segmento, dosis, mes); la asignacion recorre
+# los meses operando sobre todos los segmentos a la vez
+DOSES = ['1ra', '2da', '3ra']
+# meses maximos entre la 1ra dosis y la dosis asignada (2da ~2 meses despues, 3ra ~6 meses despues)
+MAX_LAG = {'2da': 6, '3ra': 12}
+
+
+def _bins(cube, by):
+    # ordena y agrupa las filas en un arreglo denso [segmento, dosis, mes]
+    # 'YYYY-MM' -> meses absolutos, convertido sobre los valores unicos (cube ya sin filas sin fecha)
+    codes, uniques = pd.factorize(cube.mes.astype(str))
+    t = (uniques.str[:4].astype(int)*12 + uniques.str[5:7].astype(int) - 1).to_numpy()[codes]
+    t0, n_months = t.min(), t.max() - t.min() + 1
+    if by:
+        seg, keys = pd.MultiIndex.from_frame(cube[by].astype(str)).factorize(sort=True)
+    else:
+        seg, keys = np.zeros(len(cube), dtype=np.int64), pd.Index(['all'])
+    dose = pd.Categorical(cube.dosis.astype(str), categories=DOSES).codes
+    ok = dose >= 0
+    flat = (seg[ok]*len(DOSES) + dose[ok])*n_months + (t[ok] - t0)
+    counts = np.bincount(flat, weights=cube.cantidad.to_numpy()[ok], minlength=len(keys)*len(DOSES)*n_months)
+    return counts.reshape(len(keys), len(DOSES), n_months), keys, month_to_periodo(np.arange(t0, t0 + n_months))
+
+
+def lag_profile(first, later, max_lag):
+    # later[m] ~ sum_k b[k]*first[m-k] sobre la suma de los segmentos, minimos cuadrados con b >= 0
+    f, y = first.sum(axis=0), later.sum(axis=0)
+    n = len(f)
+    X = np.column_stack([np.concatenate([np.zeros(min(k, n)), f[:max(n - k, 0)]]) for k in range(max_lag + 1)])
+    # se usan todos los meses: el inicio del archivo (sin 1ras dosis previas) es lo que identifica el desfase
+    # cuando el flujo de 1ras dosis es parejo
+    profile = nnls(X, y)[0]
+    return profile if profile.sum() > 0 else np.ones(max_lag + 1)
+
+
+def _assign(first, later, max_lag):
+    # [segmento, cohorte, meses desde la cohorte]: dosis del mes m asignadas a la cohorte m-k;
+    # las dosis sin cohorte disponible (1ra dosis antes del periodo del archivo) quedan fuera
+    profile = lag_profile(first, later, max_lag)
+    n_seg, n = first.shape
+    remaining = first.astype(float)
+    cells = np.zeros((n_seg, n, max_lag + 1))
+    for m in range(n):
+        c = np.arange(max(0, m - max_lag), m + 1)
+        pool = remaining[:, c]
+        # el perfil es la fraccion de la cohorte completa que vuelve en cada desfase (no de lo que queda)
+        weights = first[:, c] * profile[m - c]
+        total = weights.sum(axis=1)
+        take = np.minimum(later[:, m], pool.sum(axis=1))
+        # el reparto por pesos no puede pasar lo que le queda a cada cohorte
+        assigned = np.minimum(weights * np.divide(take, total, out=np.zeros(n_seg), where=total > 0)[:, None], pool)
+        remaining[:, c] -= assigned
+        cells[:, c, m - c] = assigned
+    # meses posteriores al final del archivo: aun no observados
+    c, k = np.meshgrid(np.arange(n), np.arange(max_lag + 1), indexing='ij')
+    cells[:, c + k >= n] = np.nan
+    return cells
+
+
+def cohort_matrix(cube, dose='2da', by=None, cumulative=True, **filters):
+    # filas: cohorte (y segmento si by), columnas: '1st doses' y meses desde la cohorte 0..MAX_LAG;
+    # valores: dosis `dose` de la cohorte / 1ras dosis de la cohorte (acumulado si cumulative).
+    # Celdas posteriores al ultimo mes del archivo quedan en NaN. filtros: columna=valor o columna=[valores]
+    by = [by] if isinstance(by, str) else list(by or [])
+    mask = np.ones(len(cube), dtype=bool)
+    for col, value in filters.items():
+        mask &= cube[col].isin(value if isinstance(value, (list, tuple, set)) else [value]).to_numpy()
+    # filas sin fecha no tienen cohorte
+    cube = cube[mask & cube.mes.notna().to_numpy()]
+    if cube.empty:
+        # segmento sin filas (o sin fecha): matriz vacia con las mismas columnas
+        names = (by or ['segment']) + ['cohort']
+        index = pd.MultiIndex.from_arrays([[] for _ in names], names=names)
+        matrix = pd.DataFrame(columns=['1st doses'] + list(range(MAX_LAG[dose] + 1)), index=index, dtype=float)
+        matrix['1st doses'] = matrix['1st doses'].astype(int)
+        return matrix.droplevel('segment') if not by else matrix
+    counts, keys, periodos = _bins(cube, by)
+    later = counts[:, DOSES.index(dose)]
+    cells = _assign(counts[:, 0], later, MAX_LAG[dose])
+    if cumulative:
+        cells = np.cumsum(cells, axis=2)
+    size = counts[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = cells / np.where(size > 0, size, np.nan)[:, :, None]
+    seg = keys.repeat(len(periodos))
+    levels = [seg.get_level_values(i) for i in range(seg.nlevels)]
+    index = pd.MultiIndex.from_arrays(levels + [np.tile(periodos, len(keys))], names=(by or ['segment']) + ['cohort'])
+    matrix = pd.DataFrame(share.reshape(-1, share.shape[2]), index=index, columns=range(share.shape[2]))
+    matrix.insert(0, '1st doses', size.reshape(-1).astype(int))
+    # solo cohortes con 1ras dosis
+    matrix = matrix[matrix['1st doses'] > 0]
+    return matrix.droplevel('segment') if not by else matrix
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from d4d.data import load_d4d
+from d4d.store import month_of
+
+### NOTAS DE CREDITO ###
+# costo unitario de sell-in y descuentos en % sobre el sell-in (3% por datos D4D, 5% rebate)
+UNIT_PRICE = 89550
+DISCOUNT_RULES = {'d4d': 3, 'rebate': 5}
+
+
+def price_table(prices=None):
+    # tabla de precios: customer ('*' = todos), desde (YYYY-MM, vigente desde ese mes), precio
+    if prices is None:
+        return pd.DataFrame({'customer': ['*'], 'desde': ['0000-01'], 'precio': [UNIT_PRICE]})
+    prices = pd.read_csv(prices) if isinstance(prices, (str, Path)) else prices.copy()
+    if 'customer' not in prices:
+        prices['customer'] = '*'
+    prices['customer'] = prices.customer.fillna('*').astype(str)
+    prices['desde'] = prices.desde.astype(str)
+    return prices[['customer', 'desde', 'precio']]
+
+
+def monthly_units(df, by=('customer',)):
+    by = [c for c in by if c in df.columns]
+    mes = df.mes.astype(str) if 'mes' in df.columns else month_of(df.fecha)
+    units = df.groupby(by + [mes.rename('period')], observed=True).cantidad.sum().rename('units').reset_index()
+    if 'customer' not in units:
+        units.insert(0, 'customer', '*')
+    units['customer'] = units.customer.astype(str)
+    return units
+
+
+def _month_key(s):
+    return s.str[:4].astype(int)*12 + s.str[5:7].astype(int)
+
+
+def _unit_price(units, prices):
+    # precio vigente por fila: primero el especifico del cliente, si no el general ('*'); units viene ordenado por periodo
+    left = units[['customer']].assign(key=_month_key(units.period))
+    prices = prices.assign(key=_month_key(prices.desde)).sort_values('key')
+    general = pd.merge_asof(left, prices.loc[prices.customer == '*', ['key', 'precio']], on='key', direction='backward')
+    specific = pd.merge_asof(left, prices.loc[prices.customer != '*', ['customer', 'key', 'precio']], on='key',
+                             by='customer', direction='backward')
+    return specific.precio.fillna(general.precio).to_numpy()
+
+
+def credit_notes(df, prices=None, rules=DISCOUNT_RULES, by=('customer',)):
+    # mismo calculo que la pestana Credit Notes, para todos los clientes y periodos en una sola pasada
+    units = monthly_units(df, by)
+    units = units.sort_values('period', kind='stable').reset_index(drop=True)
+    price = _unit_price(units, price_table(prices))
+    if np.isnan(price).any():
+        raise ValueError('Missing unit price for some customer periods')
+    units['sellin'] = (units.units*price).astype('int64')
+    for name, pct in rules.items():
+        units[name] = (units.sellin*pct/100).astype('int64')
+    units['total_cn'] = units[list(rules)].sum(axis=1)
+    return units.sort_values(['customer', 'period'], ascending=[True, False], ignore_index=True)
+
+
+def load_customers(files):
+    # un archivo D4D por cliente; el nombre del archivo es el cliente
+    parts = []
+    for f in files:
+        df = load_d4d(f)
+        parts.append(pd.DataFrame({'customer': Path(f).stem, 'mes': month_of(df.fecha), 'cantidad': df.cantidad}))
+    out = pd.concat(parts, ignore_index=True)
+    out['customer'] = out.customer.astype('category')
+    return out
+
+
+### BATCH ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Monthly credit notes for every customer')
+    parser.add_argument('files', nargs='+', help='one D4D file per customer')
+    parser.add_argument('--prices', default=None, help='csv with customer, desde (YYYY-MM), precio')
+    parser.add_argument('--d4d', type=float, default=DISCOUNT_RULES['d4d'], help='discount for data, %% of sell in')
+    parser.add_argument('--rebate', type=float, default=DISCOUNT_RULES['rebate'], help='rebate, %% of sell in')
+    parser.add_argument('--out', default='credit_notes.parquet')
+    args = parser.parse_args(argv)
+    cn = credit_notes(load_customers(args.files), args.prices, {'d4d': args.d4d, 'rebate': args.rebate})
+    cn.to_parquet(args.out, index=False)
+    print(f'{len(cn)} customer periods, {cn.total_cn.sum():,} in credit notes -> {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from d4d.data import FrameCache, source_digest
+from d4d.mapped import load_reference, mapped
+from d4d.store import STORE_DIR, list_months, month_of, partition_path
+
+### CUBO ###
+# cantidad pre-agregada por mes y todas las dimensiones que usan los graficos y filtros
+DIMS = ['region', 'comuna', 'especialidad', 'sexo', 'edad', 'dosis']
+CUBE_KEYS = ['mes'] + DIMS
+
+_lock = threading.Lock()
+_parts = {}
+_cubes = FrameCache(max_bytes=256 * 1024 * 1024)
+
+
+def build_cube(df):
+    # una sola pasada sobre los datos crudos; los nulos quedan como grupo propio para que cada roll-up
+    # descarte solo las filas nulas en sus propias dimensiones
+    mes = month_of(df.fecha).rename('mes')
+    cube = df.groupby([mes] + DIMS, observed=True, sort=False, dropna=False).cantidad.sum().reset_index()
+    return _typed(cube)
+
+
+def _typed(cube):
+    for col in CUBE_KEYS:
+        cube[col] = cube[col].astype('category')
+    cube['cantidad'] = cube.cantidad.astype('int64')
+    return cube
+
+
+def _partition_cube(mes, root):
+    # cubo de un mes del store, recalculado solo si la particion cambio
+    path = partition_path(mes, root)
+    st_ = os.stat(path)
+    stamp = (str(root), st_.st_mtime_ns, st_.st_size)
+    with _lock:
+        known = _parts.get((str(root), mes))
+    if known is not None and known[0] == stamp:
+        return known
+    df = pq.read_table(path, columns=['fecha'] + DIMS + ['cantidad']).to_pandas()
+    known = (stamp, build_cube(df))
+    with _lock:
+        _parts[(str(root), mes)] = known
+    return known
+
+
+def update_cube(cube, df):
+    # meses nuevos o re-cargados: se reemplazan en el cubo solo esos meses
+    new = build_cube(df)
+    keep = cube[~cube.mes.isin(new.mes.unique())]
+    return _typed(pd.concat([keep.astype({c: object for c in CUBE_KEYS}), new.astype({c: object for c in CUBE_KEYS})], ignore_index=True))
+
+
+def store_cube(root=STORE_DIR):
+    meses = list_months(root)
+    if not meses:
+        return None
+    parts = [_partition_cube(mes, root) for mes in meses]
+    key = ('store', tuple(stamp for stamp, _ in parts))
+    cube = _cubes.get(key)
+    if cube is None:
+        cube = _typed(pd.concat([p.astype({c: object for c in CUBE_KEYS}) for _, p in parts], ignore_index=True))
+        _cubes.put(key, cube)
+    return cube
+
+
+def load_cube(source, root=STORE_DIR):
+    # cubo del store parquet si tiene datos; si no, del archivo D4D indicado
+    cube = store_cube(root)
+    if cube is not None:
+        return cube
+    return file_cube(source)
+
+
+def file_cube(source):
+    # cubo de un archivo de referencia, compartido entre procesos como Arrow mapeado (d4d/mapped.py)
+    key = ('file', source_digest(source))
+    cube = _cubes.get(key)
+    if cube is None:
+        cube = mapped('cube', key[1], lambda: build_cube(load_reference(source)))
+        _cubes.put(key, cube)
+    return cube
+
+
+def rollup(cube, by, **filters):
+    # filtros: columna=valor o columna=[valores]
+    mask = pd.Series(True, index=cube.index)
+    for col, value in filters.items():
+        mask &= cube[col].isin(value if isinstance(value, (list, tuple, set)) else [value])
+    by = [by] if isinstance(by, str) else list(by)
+    return cube[mask].groupby(by, observed=True).cantidad.sum().reset_index()
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+import datetime
+import hashlib
+import os
+import threading
+import unicodedata
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from d4d.formats import Source
+
+### ESQUEMA ###
+COLUMNS = ['fecha', 'especialidad', 'region', 'id_region', 'comuna', 'sexo', 'edad', 'dosis', 'cantidad']
+CATEGORIES = ['especialidad', 'region', 'id_region', 'comuna', 'sexo', 'edad', 'dosis']
+DATE_FORMAT = '%d-%m-%Y'
+# variantes de fecha aceptadas en archivos de otros distribuidores
+DATE_FORMATS = [DATE_FORMAT, '%d/%m/%Y', '%Y-%m-%d']
+ENCODING = 'latin-1'
+SEP = ';'
+
+# encabezados del archivo D4D (normalizados sin tildes) -> columnas de df_clean
+HEADERS = {
+    'fecha_vacunacion': 'fecha',
+    'especialidad_prescribe': 'especialidad',
+    'region': 'region',
+    'id_region': 'id_region',
+    'comuna': 'comuna',
+    'sexo': 'sexo',
+    'rango_etario': 'edad',
+    'dosis': 'dosis',
+    'cantidad': 'cantidad',
+}
+HEADERS.update({col: col for col in COLUMNS})
+
+# limite de memoria del cache de frames compartido entre reruns y sesiones
+CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# rutas en disco cuya huella se recuerda (LRU); cada una apunta a lo sumo a un frame del cache
+MAX_DIGESTS = 256
+
+
+### FUNCIONES ###
+def df_clean(df):
+    # mismas columnas posicionales de siempre, pero con tipos compactos
+    df.columns = COLUMNS
+    df['fecha'] = pd.to_datetime(df.fecha, format=DATE_FORMAT)
+    for col in CATEGORIES:
+        df[col] = df[col].astype('category')
+    df['cantidad'] = df.cantidad.astype('int32')
+    return df
+
+
+def normalize_header(name):
+    name = unicodedata.normalize('NFKD', name.strip().strip('"')).encode('ascii', 'ignore').decode()
+    return '_'.join(name.lower().split())
+
+
+def map_headers(names):
+    cols = []
+    for name in names:
+        key = normalize_header(name)
+        if key not in HEADERS:
+            raise ValueError(f'Unknown D4D column: {name}')
+        cols.append(HEADERS[key])
+    return cols
+
+
+def arrow_schema():
+    types = {col: pa.dictionary(pa.int32(), pa.string()) for col in CATEGORIES}
+    types['fecha'] = pa.timestamp('ns')
+    types['cantidad'] = pa.int32()
+    return types
+
+
+def d4d_columns(header):
+    # encabezados conocidos (HEADERS); si no se reconocen pero son 9, las columnas posicionales de siempre
+    try:
+        return map_headers(header)
+    except ValueError:
+        if len(header) == len(COLUMNS):
+            return COLUMNS
+        raise
+
+
+def open_d4d(source):
+    # encoding, separador, compresion y Excel detectados de los primeros bytes (d4d/formats.py)
+    return Source(source, ENCODING, SEP)
+
+
+def csv_options(src, block_size=None):
+    read_options = pacsv.ReadOptions(encoding=src.encoding, column_names=d4d_columns(src.header), skip_rows=1)
+    if block_size is not None:
+        read_options.block_size = block_size
+    return {
+        'read_options': read_options,
+        'parse_options': pacsv.ParseOptions(delimiter=src.delimiter),
+        'convert_options': pacsv.ConvertOptions(column_types=arrow_schema(), timestamp_parsers=DATE_FORMATS),
+    }
+
+
+def parse_dates(values):
+    # mismos formatos que el lector CSV (timestamp_parsers=DATE_FORMATS); celdas de fecha de Excel se aceptan tal cual
+    text = values.map(lambda v: v.strftime(DATE_FORMATS[-1]) if isinstance(v, datetime.date) else str(v).strip())
+    out = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    for fmt in DATE_FORMATS:
+        out = out.fillna(pd.to_datetime(text, format=fmt, errors='coerce'))
+    bad = out.isna() & values.notna()
+    if bad.any():
+        raise ValueError(f'Invalid date: {values[bad].iloc[0]}')
+    return out
+
+
+def excel_frame(src):
+    df = pd.read_excel(src.open_file())
+    df.columns = d4d_columns([str(c) for c in df.columns])
+    df = df[COLUMNS]
+    if not pd.api.types.is_datetime64_any_dtype(df.fecha):
+        df['fecha'] = parse_dates(df.fecha)
+    for col in CATEGORIES:
+        # celdas vacias quedan nulas, como en el lector CSV (no 'nan')
+        df[col] = df[col].astype(str).where(df[col].notna()).astype('category')
+    df['cantidad'] = df.cantidad.astype('int32')
+    return df
+
+
+def parse_d4d(data):
+    # data: bytes o ruta de un archivo D4D en cualquiera de los formatos soportados
+    src = open_d4d(data)
+    if src.kind == 'excel':
+        return excel_frame(src)
+    try:
+        table = pacsv.read_csv(src.stream(), **csv_options(src))
+    finally:
+        src.close()
+    return table.select(COLUMNS).to_pandas()
+
+
+def file_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def frame_digest(df):
+    # huella de un frame ya cargado (cubos, agregados) para usarla como llave de cache
+    return file_digest(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes() + ','.join(df.columns).encode())
+
+
+### CACHE ###
+class FrameCache:
+    # LRU por hash de contenido, acotado por memoria y/o numero de entradas (max_bytes=None: sin limite de memoria);
+    # el frame devuelto es compartido y no se debe modificar
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, sizeof=None, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.sizeof = sizeof or ((lambda _: 0) if max_bytes is None else (lambda df: int(df.memory_usage(deep=True).sum())))
+        self.frames = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.frames:
+                return None
+            self.frames.move_to_end(key)
+            return self.frames[key][0]
+
+    def put(self, key, df):
+        size = self.sizeof(df)
+        with self.lock:
+            if key in self.frames:
+                self.nbytes -= self.frames.pop(key)[1]
+            self.frames[key] = (df, size)
+            self.nbytes += size
+            while len(self.frames) > 1 and self._over():
+                _, (_, old) = self.frames.popitem(last=False)
+                self.nbytes -= old
+
+    def _over(self):
+        return ((self.max_bytes is not None and self.nbytes > self.max_bytes)
+                or (self.max_entries is not None and len(self.frames) > self.max_entries))
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.nbytes = 0
+
+
+_frames = FrameCache()
+_digests = OrderedDict()
+_digests_lock = threading.Lock()
+_derived = {}
+_derived_lock = threading.Lock()
+
+
+def derived(df, name, build):
+    # estructura derivada de un frame del cache (indices, tablas arrow), reutilizada mientras el frame siga vivo
+    key = (id(df), name)
+    with _derived_lock:
+        known = _derived.get(key)
+        if known is not None and known[0]() is df:
+            return known[1]
+    value = build(df)
+    with _derived_lock:
+        _derived[key] = (weakref.ref(df, lambda _, key=key, cache=_derived: cache.pop(key, None)), value)
+    return value
+
+
+def _read_source(source):
+    # ruta en disco: si (mtime, size) no cambio, no se vuelve a leer ni a hashear el archivo
+    if isinstance(source, (str, os.PathLike)):
+        path = os.path.abspath(source)
+        st_ = os.stat(path)
+        stamp = (st_.st_mtime_ns, st_.st_size)
+        with _digests_lock:
+            known = _digests.get(path)
+            if known is not None and known[0] == stamp:
+                _digests.move_to_end(path)
+                return known[1], None
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = file_digest(data)
+        with _digests_lock:
+            _digests[path] = (stamp, digest)
+            _digests.move_to_end(path)
+            while len(_digests) > MAX_DIGESTS:
+                _digests.popitem(last=False)
+        return digest, data
+    # archivo subido (st.file_uploader) o bytes
+    data = source.getvalue() if hasattr(source, 'getvalue') else bytes(source)
+    return file_digest(data), data
+
+
+def source_digest(source):
+    return _read_source(source)[0]
+
+
+def load_d4d(source):
+    digest, data = _read_source(source)
+    df = _frames.get(digest)
+    if df is None:
+        if data is None:
+            with open(source, 'rb') as f:
+                data = f.read()
+        df = parse_d4d(data)
+        _frames.put(digest, df)
+    return df
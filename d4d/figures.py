@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import plotly.express as px
+
+from d4d.cube import rollup
+from d4d.data import FrameCache, derived, frame_digest
+
+### GRAFICOS ###
+# cada eje categorico de los graficos muestra a lo sumo TOP_N valores: el resto se agrupa en 'Other'.
+# Los graficos son barras y tortas sobre roll-ups del cubo (plotly no tiene variante WebGL para ellas):
+# el tamano del payload lo acota la agregacion, no el numero de filas del archivo
+TOP_N = 12
+OTHER = 'Other'
+MAX_FIGURES = 128
+
+# figuras listas por huella de datos + paleta + ajustes, compartidas entre reruns y sesiones
+_figures = FrameCache(max_bytes=None, max_entries=MAX_FIGURES)
+
+
+def top_n(df, col, n=TOP_N):
+    # valores de `col` fuera de los n-1 con mas dosis se agrupan en 'Other'; las demas columnas se conservan
+    totals = df.groupby(col, observed=True).cantidad.sum()
+    if len(totals) <= n:
+        return df
+    keep = totals.nlargest(n - 1).index
+    df = df.assign(**{col: df[col].astype(str).where(df[col].isin(keep), OTHER)})
+    by = [c for c in df.columns if c != 'cantidad']
+    return df.groupby(by, sort=False, observed=True).cantidad.sum().reset_index()
+
+
+def build_charts(cube, fig_palette, top=TOP_N):
+    df1 = top_n(top_n(rollup(cube, ['sexo','edad']), 'edad', top), 'sexo', top)
+    fig1 = px.bar(df1, x="edad", y="cantidad", color='sexo', barmode='group',title='Vaccination by age and sex', color_discrete_sequence=fig_palette)
+    df2 = top_n(rollup(cube, 'comuna'), 'comuna', top)
+    fig2 = px.pie(df2, values='cantidad', names='comuna', title='Distribution of districts ', color_discrete_sequence=fig_palette)
+    df3 = top_n(rollup(cube, 'especialidad'), 'especialidad', top).sort_values(by='cantidad')
+    fig3 = px.bar(df3, x='cantidad', y='especialidad', title='Specialty prescribers', color_discrete_sequence=fig_palette)
+    df4 = top_n(rollup(cube, 'dosis'), 'dosis', top).sort_values(by='cantidad', ascending=False)
+    fig4 = px.bar(df4, x='dosis', y='cantidad', title='Vaccinated by dose', color_discrete_sequence=fig_palette)
+    return fig1, fig2, fig3, fig4
+
+
+def df_charts(cube, fig_palette, top=TOP_N):
+    # los cuatro graficos de analytics, cacheados por contenido del cubo
+    key = (derived(cube, 'digest', frame_digest), tuple(fig_palette), top)
+    figs = _figures.get(key)
+    if figs is None:
+        figs = build_charts(cube, fig_palette, top)
+        _figures.put(key, figs)
+    return figs
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from d4d.data import derived
+
+### SEGUIMIENTO ###
+# la 2da dosis se espera 2 meses despues de la 1ra y la 3ra 4 meses despues de la 2da
+NEXT_DOSE = {'2nd dose': ('1ra', 2), '3rd dose': ('2da', 4)}
+
+
+def month_number(fecha):
+    return (fecha.dt.year*12 + fecha.dt.month - 1).to_numpy()
+
+
+def periodo_to_month(periodo):
+    return int(periodo[:4])*12 + int(periodo[4:]) - 1
+
+
+def month_to_periodo(months):
+    months = np.asarray(months)
+    return np.char.add((months//12).astype(str), np.char.zfill((months % 12 + 1).astype(str), 2))
+
+
+class FollowUpIndex:
+    # filas ordenadas por mes de vencimiento de la siguiente dosis; cada consulta es un searchsorted.
+    # Solo guarda posiciones: el frame se pasa en cada consulta, asi el indice no lo mantiene vivo
+    # (derived() lo descarta cuando el frame sale del cache)
+    def __init__(self, df):
+        months = month_number(df.fecha)
+        self.due = {}
+        for name, (dosis, lag) in NEXT_DOSE.items():
+            pos = np.flatnonzero((df.dosis == dosis).to_numpy())
+            due = months[pos] + lag
+            order = np.argsort(due, kind='stable')
+            self.due[name] = (due[order], pos[order])
+        # mismos periodos que antes: fecha + 2 meses de todas las filas, del mas reciente al mas antiguo
+        self.periodos = month_to_periodo(np.unique(months + 2)[::-1])
+
+    def positions(self, name, periodo):
+        due, pos = self.due[name]
+        month = periodo_to_month(periodo)
+        lo, hi = np.searchsorted(due, [month, month + 1])
+        return pos[lo:hi]
+
+    def due_rows(self, df, periodo):
+        return {name: df.iloc[self.positions(name, periodo)] for name in NEXT_DOSE}
+
+    def due_table(self, df):
+        # todas las listas de seguimiento de todos los periodos en un solo frame
+        parts = []
+        for name, (due, pos) in self.due.items():
+            part = df.iloc[pos].copy()
+            part.insert(0, 'next_dose', name)
+            part.insert(0, 'periodo', month_to_periodo(due))
+            parts.append(part)
+        return pd.concat(parts)
+
+    def due_counts(self):
+        counts = {}
+        for name, (due, _) in self.due.items():
+            months, n = np.unique(due, return_counts=True)
+            counts[name] = pd.Series(n, index=month_to_periodo(months))
+        return pd.DataFrame(counts).fillna(0).astype(int).sort_index(ascending=False)
+
+
+def followup_index(df):
+    return derived(df, 'followup', FollowUpIndex)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from d4d.cube import build_cube, rollup
+from d4d.data import FrameCache, derived, frame_digest, load_d4d
+from d4d.store import STORE_DIR
+
+### PRONOSTICO DE DEMANDA ###
+# modelos livianos ajustados a todas las series a la vez (una fila por serie, una columna por mes);
+# por serie se elige el de menor error absoluto en los ultimos BACKTEST meses
+SEASON = 12
+BACKTEST = 3
+ALPHAS = np.round(np.linspace(.1, .9, 9), 1)
+MODEL_DIR = STORE_DIR / '_models'
+# modelos guardados en disco; se conservan los de uso mas reciente
+MAX_MODELS = 32
+# va en la llave de cada modelo en disco: subirla cada vez que cambie fit_forecast o series_matrix
+MODEL_VERSION = 1
+
+_forecasts = FrameCache(max_bytes=128 * 1024 * 1024)
+
+
+def monthly_matrix(cube, by=()):
+    # series mensuales completas (meses sin ventas en 0) por grupo de `by`; sin `by` una sola serie total
+    by = list(by)
+    s = rollup(cube, by + ['mes'])
+    s['mes'] = s.mes.astype(str)
+    months = pd.period_range(s.mes.min(), s.mes.max(), freq='M').strftime('%Y-%m')
+    if by:
+        wide = s.pivot_table(index=by, columns='mes', values='cantidad', aggfunc='sum', observed=True)
+    else:
+        wide = s.set_index('mes').cantidad.to_frame('all').T
+    return wide.reindex(columns=months).fillna(0).astype(float)
+
+
+def _ses(Y):
+    # suavizamiento exponencial simple para todos los alphas y series: (alpha, serie, mes) ajustado un paso adelante
+    a = ALPHAS[:, None]
+    level = np.repeat(Y[None, :, 0], len(ALPHAS), axis=0)
+    fitted = np.empty((len(ALPHAS),) + Y.shape)
+    fitted[:, :, 0] = level
+    for t in range(1, Y.shape[1]):
+        fitted[:, :, t] = level
+        level = a*Y[None, :, t] + (1 - a)*level
+    return fitted, level
+
+
+def fit_forecast(wide, horizon=1):
+    Y = wide.to_numpy()
+    n, T = Y.shape
+    names = ['naive', 'seasonal_naive'] + [f'ses_{a}' for a in ALPHAS]
+    fitted = np.full((len(names), n, T), np.nan)
+    fitted[0, :, 1:] = Y[:, :-1]
+    if T > SEASON:
+        fitted[1, :, SEASON:] = Y[:, :-SEASON]
+    ses_fitted, level = _ses(Y)
+    fitted[2:] = ses_fitted
+    window = slice(max(T - BACKTEST, 1), T)
+    errors = np.abs(fitted[:, :, window] - Y[None, :, window]).mean(axis=-1)
+    errors = np.where(np.isnan(errors), np.inf, errors)
+    forecasts = np.empty((len(names), n, horizon))
+    forecasts[0] = Y[:, -1:]
+    steps = T - SEASON + np.arange(horizon) % SEASON
+    forecasts[1] = Y[:, steps] if T >= SEASON else np.nan
+    forecasts[2:] = level[:, :, None]
+    best = errors.argmin(axis=0)
+    rows = np.arange(n)
+    future = pd.period_range(pd.Period(wide.columns[-1], freq='M') + 1, periods=horizon, freq='M').strftime('%Y-%m')
+    out = pd.DataFrame(np.clip(forecasts[best, rows], 0, None), index=wide.index, columns=future)
+    out.insert(0, 'mae', errors[best, rows])
+    out.insert(0, 'model', np.array(names)[best])
+    return out
+
+
+def recommended_units(forecast, mes=None):
+    mes = mes or [c for c in forecast.columns if c not in ('model', 'mae')][0]
+    return np.ceil(forecast[mes]).astype(int)
+
+
+def series_matrix(cube, by=()):
+    return derived(cube, ('series', tuple(by)), lambda c: monthly_matrix(c, by))
+
+
+def prune_models(model_dir=MODEL_DIR, keep=None):
+    keep = MAX_MODELS if keep is None else keep
+    files = sorted(Path(model_dir).glob('forecast-*.parquet'), key=lambda p: p.stat().st_mtime_ns, reverse=True)
+    for path in files[keep:]:
+        path.unlink(missing_ok=True)
+
+
+def load_forecast(cube, by=(), horizon=1, model_dir=MODEL_DIR):
+    # store de modelos: memoria -> parquet en disco -> ajuste; la pagina normalmente solo hace el lookup.
+    # La llave es la huella de las series que entran al modelo: no depende del orden ni de los tipos del cubo
+    series = series_matrix(cube, by)
+    key = f'v{MODEL_VERSION}-{frame_digest(series.reset_index())}-{horizon}'
+    forecast = _forecasts.get(key)
+    if forecast is not None:
+        return forecast
+    path = Path(model_dir) / f'forecast-{key}.parquet'
+    try:
+        forecast = pd.read_parquet(path)
+        # uso reciente: el modelo queda fuera de la poda
+        os.utime(path)
+    except FileNotFoundError:
+        forecast = fit_forecast(series, horizon)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        forecast.to_parquet(path)
+        prune_models(model_dir)
+    _forecasts.put(key, forecast)
+    return forecast
+
+
+### BATCH ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fit demand forecasts for every series of a D4D file')
+    parser.add_argument('file')
+    parser.add_argument('--by', nargs='*', default=[], help='series columns, e.g. region comuna')
+    parser.add_argument('--horizon', type=int, default=1)
+    parser.add_argument('--out', default=None, help='parquet output (default: model store)')
+    args = parser.parse_args(argv)
+    cube = build_cube(load_d4d(args.file))
+    if args.out:
+        fit_forecast(monthly_matrix(cube, args.by), args.horizon).to_parquet(args.out)
+    else:
+        load_forecast(cube, tuple(args.by), args.horizon)
+
+
+if __name__ == '__main__':
+    main()
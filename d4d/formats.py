@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import codecs
+import io
+import os
+import zipfile
+import zlib
+
+import pyarrow as pa
+
+### FORMATOS DE ENTRADA ###
+# los distribuidores mandan el D4D en latin-1 o UTF-8, separado por ';', ',' o tabs, comprimido (gzip, zip) o en Excel.
+# Todo se detecta con una muestra de los primeros bytes y los CSV terminan en el mismo lector pyarrow multithread
+SAMPLE_BYTES = 64 * 1024
+DELIMITERS = [';', ',', '\t', '|']
+GZIP_MAGIC = b'\x1f\x8b'
+ZIP_MAGIC = b'PK\x03\x04'
+# Excel 97-2003 (.xls); los .xlsx son zip con la carpeta xl/
+XLS_MAGIC = b'\xd0\xcf\x11\xe0'
+# prefijo del codec UTF-8 con respaldo (ver _utf8_or)
+UTF8_OR = 'utf_8_or_'
+
+
+class _Utf8OrFallback(codecs.IncrementalDecoder):
+    # UTF-8 hasta el primer byte invalido; desde ahi el resto del archivo con el encoding de respaldo
+    fallback = None
+
+    def __init__(self, errors='strict'):
+        super().__init__(errors)
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors)
+        self.switched = False
+
+    def decode(self, data, final=False):
+        if not self.switched:
+            try:
+                return self.decoder.decode(data, final)
+            except UnicodeDecodeError:
+                # bytes pendientes de un caracter multibyte cortado + el bloque actual
+                data = self.decoder.getstate()[0] + data
+                self.decoder = codecs.getincrementaldecoder(self.fallback)(self.errors)
+                self.switched = True
+        return self.decoder.decode(data, final)
+
+    def reset(self):
+        self.decoder = codecs.getincrementaldecoder('utf-8')(self.errors)
+        self.switched = False
+
+
+def _utf8_or(name):
+    # codec 'utf_8_or_<encoding>' (p. ej. utf_8_or_latin_1) para el lector pyarrow, que recibe el encoding por nombre
+    if not name.startswith(UTF8_OR):
+        return None
+    fallback = codecs.lookup(name[len(UTF8_OR):]).name
+    decoder = type('Decoder', (_Utf8OrFallback,), {'fallback': fallback})
+
+    def decode(data, errors='strict'):
+        try:
+            return codecs.utf_8_decode(data, errors, True)
+        except UnicodeDecodeError:
+            return codecs.decode(data, fallback, errors), len(data)
+    return codecs.CodecInfo(codecs.utf_8_encode, decode, name=name, incrementaldecoder=decoder,
+                            incrementalencoder=codecs.getincrementalencoder('utf-8'))
+
+
+codecs.register(_utf8_or)
+
+
+def sniff_encoding(sample, default, complete=False):
+    # complete: la muestra es el archivo entero
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        # la muestra puede cortar un caracter multibyte al final
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=complete)
+    except UnicodeDecodeError:
+        return default
+    if complete:
+        return 'utf-8'
+    # los primeros bytes no prueban que el resto sea UTF-8 (p. ej. un latin-1 sin tildes al inicio):
+    # se lee como UTF-8 y se pasa al encoding por defecto en el primer byte invalido
+    return UTF8_OR + codecs.lookup(default).name.replace('-', '_')
+
+
+def sniff_delimiter(text, default):
+    # el separador que aparece en el encabezado y el mismo numero de veces en las lineas siguientes
+    lines = text.splitlines()
+    lines = lines[:-1] if len(lines) > 1 else lines
+    header, rows = lines[0], lines[1:20]
+    counts = {d: header.count(d) for d in DELIMITERS if header.count(d)}
+    if not counts:
+        return default
+    return max(counts, key=lambda d: (all(row.count(d) == counts[d] for row in rows), counts[d]))
+
+
+def _raw(source):
+    # ruta, archivo subido (st.file_uploader) o bytes -> archivo pyarrow nativo y tamano en bytes
+    if isinstance(source, (str, os.PathLike)):
+        return pa.OSFile(str(source), 'rb'), os.path.getsize(source)
+    # archivo subido: se lee su buffer sin copiarlo
+    data = pa.py_buffer(source.getbuffer() if hasattr(source, 'getbuffer') else source)
+    return pa.BufferReader(data), data.size
+
+
+def _zip_member(zf):
+    names = [n for n in zf.namelist() if not n.endswith('/')]
+    if not names:
+        raise ValueError('Empty zip file')
+    return names[0]
+
+
+class Source:
+    # archivo D4D abierto: kind ('csv' o 'excel'), muestra descomprimida, y stream()/position() para leerlo
+    def __init__(self, source, default_encoding, default_delimiter):
+        raw, self.size = _raw(source)
+        head = raw.read(SAMPLE_BYTES)
+        raw.close()
+        self.source = source
+        self.zip_member = None
+        if head.startswith(GZIP_MAGIC):
+            self.kind, self.compression = 'csv', 'gzip'
+            sample = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(head, SAMPLE_BYTES)
+        elif head.startswith(ZIP_MAGIC):
+            with zipfile.ZipFile(self.open_file()) as zf:
+                if any(n.startswith('xl/') for n in zf.namelist()):
+                    self.kind, self.compression, sample = 'excel', None, b''
+                else:
+                    self.kind, self.compression = 'csv', 'zip'
+                    self.zip_member = _zip_member(zf)
+                    self.size = zf.getinfo(self.zip_member).file_size
+                    with zf.open(self.zip_member) as f:
+                        sample = f.read(SAMPLE_BYTES)
+        elif head.startswith(XLS_MAGIC):
+            self.kind, self.compression, sample = 'excel', None, b''
+        else:
+            self.kind, self.compression, sample = 'csv', None, head
+        self.sample = sample
+        # gzip: la muestra sale de los primeros bytes comprimidos y nunca se sabe si es el archivo entero
+        self.encoding = sniff_encoding(sample, default_encoding, complete=len(sample) < SAMPLE_BYTES and self.compression != 'gzip')
+        text = sample.decode(self.encoding, errors='ignore').lstrip('\ufeff')
+        self.delimiter = sniff_delimiter(text, default_delimiter) if text else default_delimiter
+        self.header = text.splitlines()[0].split(self.delimiter) if text else []
+        self._stream = self._zip = None
+
+    def open_file(self):
+        if isinstance(self.source, (str, os.PathLike)):
+            return open(self.source, 'rb')
+        return io.BytesIO(self.source.getvalue() if hasattr(self.source, 'getvalue') else bytes(self.source))
+
+    def stream(self):
+        # stream descomprimido al vuelo; gzip se descomprime en C dentro de pyarrow
+        if self.compression == 'zip':
+            self._zip = zipfile.ZipFile(self.open_file())
+            self._stream = self._zip.open(self.zip_member)
+            return pa.PythonFile(self._stream, mode='r')
+        raw, _ = _raw(self.source)
+        self._stream = raw
+        if self.compression == 'gzip':
+            return pa.CompressedInputStream(raw, 'gzip')
+        return raw
+
+    def position(self):
+        # bytes leidos del archivo (comprimido o no) para la barra de progreso
+        return self._stream.tell() if self._stream is not None else 0
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+        if self._zip is not None:
+            self._zip.close()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+import functools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from d4d.cohorts import cohort_matrix
+from d4d.data import derived
+from d4d.simulator import break_even_price, df_dosis, scenario, scenario_grid, unit_economics
+
+### GRAFO DE CALCULO ###
+# datos -> conteos por dosis -> economia unitaria -> escenarios -> tablas formateadas.
+# Cada nodo recuerda sus ultimos resultados por valor de sus entradas: un cambio de input solo recalcula
+# los nodos que dependen de el. Los nodos sobre frames usan derived() y viven lo que vive el frame en cache
+NODE_SIZE = 32
+ADH_AXIS = np.linspace(0, 1, 101)
+DOSES = ['1st dose', '2nd dose', '3rd dose']
+
+# con fragments (streamlit >= 1.33) un cambio de input reejecuta solo la funcion decorada; en versiones
+# anteriores se reejecuta el script completo, pero todo lo que esta arriba del input sale del cache
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda fn: fn)
+
+
+class Node:
+    # memo LRU por argumentos (deben ser hashables); el resultado es compartido y no se debe modificar
+    def __init__(self, fn, size=NODE_SIZE):
+        self.fn, self.size = fn, size
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+        functools.update_wrapper(self, fn)
+
+    def __call__(self, *args):
+        with self.lock:
+            if args in self.results:
+                self.results.move_to_end(args)
+                return self.results[args]
+        value = self.fn(*args)
+        with self.lock:
+            self.results[args] = value
+            while len(self.results) > self.size:
+                self.results.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+
+def node(fn):
+    return Node(fn)
+
+
+def _clp(x):
+    return '{:,}'.format(int(x))
+
+
+def _pct(x):
+    return (x*100).round(1).astype(str)+'%'
+
+
+### NODOS DE DATOS ###
+def dose_counts(df):
+    return derived(df, 'dosis', df_dosis)
+
+
+def cohorts(cube, dose, **filters):
+    key = ('cohorts', dose) + tuple(sorted(filters.items()))
+    return derived(cube, key, lambda c: cohort_matrix(c, dose, **filters))
+
+
+### NODOS DEL SIMULADOR ###
+@node
+def economics(precio, costo, dcto):
+    return unit_economics(precio, costo, dcto)
+
+
+@node
+def scenarios(dosis_n, precio, costo, dcto, adh2, adh3):
+    return scenario(dosis_n, precio, costo, dcto, adh2, adh3)
+
+
+@node
+def economics_tables(precio, costo, dcto):
+    eco = economics(precio, costo, dcto)
+    left = pd.DataFrame.from_dict({
+        'Price':[precio, precio/precio],
+        'Tax':[eco['tax'], eco['tax']/precio],
+        'Cost':[costo, costo/precio]
+        }, columns = ['CLP', '%'], orient='index')
+    right = pd.DataFrame.from_dict({
+        'Margin':[eco['margin'], eco['margin']/precio],
+        'Discount':[eco['discount'], dcto],
+        'Post discount margin':[eco['net_margin'], eco['net_margin']/precio]
+        }, columns = ['CLP', '%'], orient='index')
+    for _ in (left, right):
+        _['%'] = _pct(_['%'])
+        _['CLP'] = _['CLP'].apply(_clp)
+    return left, right
+
+
+@node
+def scenario_tables(dosis, precio, costo, dcto, adh2, adh3):
+    dosis1_n, dosis1_p, dosis2_n, dosis2_p, dosis3_n, dosis3_p = dosis
+    sc = scenarios((dosis1_n, dosis2_n, dosis3_n), precio, costo, dcto, adh2, adh3)
+    current = pd.DataFrame.from_dict({
+        'Adherence [%]':[dosis1_p, dosis2_p, dosis3_p],
+        'Sales [doses]':sc['current_doses'],
+        'Sales [CLP]':sc['current_sales'],
+        'Margin [CLP]':sc['current_margin']
+        }, columns = DOSES, orient='index')
+    potential = pd.DataFrame.from_dict({
+        'Adherence [%]':[1, adh2, adh3],
+        'Sales [doses]':sc['potential_doses'],
+        'Sales [CLP]':sc['potential_sales'],
+        'Margin [CLP]':sc['potential_margin']
+        }, columns = DOSES, orient='index')
+    opportunity = pd.DataFrame.from_dict({
+        'Sales [doses]':[sc['current_doses'].sum(), sc['potential_doses'].sum(), sc['opportunity_doses']],
+        'Sales [CLP]':[sc['current_sales'].sum(), sc['potential_sales'].sum(), sc['opportunity_sales']],
+        'Margin [CLP]':[sc['current_margin'].sum(), sc['potential_margin'].sum(), sc['opportunity_margin']]
+        }, columns = ['Current', 'Potencial', 'Opportunity'], orient='index')
+    for _ in (current, potential):
+        _.loc['Adherence [%]'] = _pct(_.loc['Adherence [%]'].astype(float))
+    for _ in (current, potential, opportunity):
+        for row in ['Sales [doses]', 'Sales [CLP]', 'Margin [CLP]']:
+            _.loc[row] = _.loc[row].apply(_clp)
+    return current, potential, opportunity
+
+
+@node
+def sensitivity_figures(dosis_n, precio, costo, dcto, fig_palette):
+    # oportunidad de margen para todas las metas de adherencia 2da x 3ra dosis (101 x 101 escenarios)
+    grid = scenario_grid(dosis_n, precio, costo, dcto, ADH_AXIS, ADH_AXIS)
+    fig5 = px.imshow(grid['opportunity_margin'][0, 0, 0], x=ADH_AXIS*100, y=ADH_AXIS*100, origin='lower', aspect='auto',
+                     labels={'x':'Adherence goal 3rd dose [%]', 'y':'Adherence goal 2nd dose [%]', 'color':'Margin [CLP]'},
+                     title='Margin opportunity by adherence goals', color_continuous_scale=[fig_palette[2], fig_palette[0], fig_palette[3]])
+    # precio de equilibrio segun costo neto, para varios descuentos
+    cost_axis = np.linspace(costo*.5, costo*1.5, 101)
+    dctos = np.array(sorted({0, dcto, .05, .1}))
+    _ = pd.DataFrame({
+        'Net cost': np.tile(cost_axis, len(dctos)),
+        'Break-even price': break_even_price(cost_axis[None, :], dctos[:, None]).ravel(),
+        'Discount': np.repeat([f'{d:.0%}' for d in dctos], len(cost_axis))
+        })
+    fig6 = px.line(_, x='Net cost', y='Break-even price', color='Discount', title='Break-even sales price', color_discrete_sequence=list(fig_palette))
+    fig6.add_hline(y=precio, line_dash='dot', annotation_text='Sales price')
+    fig6.add_vline(x=costo, line_dash='dot', annotation_text='Net cost')
+    return fig5, fig6
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from d4d import data
+from d4d.credit_notes import credit_notes
+from d4d.cube import build_cube
+from d4d.data import CATEGORIES, COLUMNS, load_d4d, source_digest
+from d4d.followup import followup_index
+from d4d.simulator import df_dosis
+
+### TABLEAU HYPER ###
+# datos limpios y tablas agregadas en un .hyper para el equipo de BI, y lectura de vuelta para las apps.
+# Carga en bloque: cada tabla se escribe como parquet temporal y Hyper la ingiere con un solo COPY,
+# sin recorrer filas en python. tableauhyperapi se importa solo al usarlo
+SCHEMA = 'Extract'
+# sin hyperd.log en el directorio de trabajo
+HYPER_PARAMS = {'log_config': ''}
+
+
+def bi_tables(df):
+    dosis1_n, dosis1_p, dosis2_n, dosis2_p, dosis3_n, dosis3_p = df_dosis(df)
+    return {
+        'd4d': df,
+        'cube': build_cube(df),
+        'adherence': pd.DataFrame({'dosis': ['1ra', '2da', '3ra'],
+                                   'vaccinated': [dosis1_n, dosis2_n, dosis3_n],
+                                   'adherence': [dosis1_p, dosis2_p, dosis3_p]}),
+        'followup': followup_index(df).due_table(df),
+        'credit_notes': credit_notes(df),
+    }
+
+
+def _hyper_table(table):
+    # categorias como texto y fechas como date (las fechas D4D no tienen hora)
+    fields, columns = [], []
+    for field, col in zip(table.schema, table.columns):
+        if pa.types.is_dictionary(field.type):
+            col = pc.cast(col, pa.string())
+        elif pa.types.is_timestamp(field.type):
+            col = pc.cast(col, pa.date32())
+        elif pa.types.is_integer(field.type) and field.type.bit_width < 32:
+            col = pc.cast(col, pa.int32())
+        fields.append(pa.field(field.name, col.type))
+        columns.append(col)
+    return pa.table(columns, schema=pa.schema(fields))
+
+
+def _sql_type(type_):
+    from tableauhyperapi import SqlType
+    if pa.types.is_string(type_):
+        return SqlType.text()
+    if pa.types.is_date(type_):
+        return SqlType.date()
+    if pa.types.is_int32(type_):
+        return SqlType.int()
+    if pa.types.is_integer(type_):
+        return SqlType.big_int()
+    if pa.types.is_floating(type_):
+        return SqlType.double()
+    if pa.types.is_boolean(type_):
+        return SqlType.bool()
+    raise ValueError(f'No Hyper type for {type_}')
+
+
+def export_hyper(tables, path):
+    from tableauhyperapi import (Connection, CreateMode, HyperProcess, TableDefinition, TableName, Telemetry,
+                                 escape_string_literal)
+    counts = {}
+    with tempfile.TemporaryDirectory() as tmp, \
+            HyperProcess(Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, parameters=HYPER_PARAMS) as hyper, \
+            Connection(hyper.endpoint, str(path), CreateMode.CREATE_AND_REPLACE) as conn:
+        conn.catalog.create_schema_if_not_exists(SCHEMA)
+        for name, df in tables.items():
+            table = _hyper_table(pa.Table.from_pandas(df, preserve_index=False))
+            definition = TableDefinition(TableName(SCHEMA, name),
+                                         [TableDefinition.Column(f.name, _sql_type(f.type)) for f in table.schema])
+            conn.catalog.create_table(definition)
+            staged = Path(tmp) / f'{name}.parquet'
+            pq.write_table(table, staged)
+            counts[name] = conn.execute_command(
+                f'COPY {definition.table_name} FROM {escape_string_literal(str(staged))} WITH (FORMAT PARQUET)')
+    return counts
+
+
+def read_hyper(path, table='d4d'):
+    from tableauhyperapi import Connection, HyperException, HyperProcess, TableName, Telemetry, escape_string_literal
+    name = TableName(SCHEMA, table)
+    with tempfile.TemporaryDirectory() as tmp, \
+            HyperProcess(Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, parameters=HYPER_PARAMS) as hyper, \
+            Connection(hyper.endpoint, str(path)) as conn:
+        staged = Path(tmp) / f'{table}.parquet'
+        try:
+            conn.execute_command(f'COPY {name} TO {escape_string_literal(str(staged))} WITH (FORMAT PARQUET)')
+            df = pq.read_table(staged).to_pandas()
+        except HyperException:
+            # versiones de Hyper sin COPY TO: lectura por filas
+            columns = [c.name.unescaped for c in conn.catalog.get_table_definition(name).columns]
+            df = pd.DataFrame(conn.execute_list_query(f'SELECT * FROM {name}'), columns=columns)
+    if table == 'd4d':
+        df = df[COLUMNS]
+        df['fecha'] = pd.to_datetime(df.fecha.astype(str))
+        for col in CATEGORIES:
+            df[col] = df[col].astype('category')
+        df['cantidad'] = df.cantidad.astype('int32')
+    return df
+
+
+def load_hyper(source, table='d4d'):
+    # ruta o archivo subido; Hyper necesita un archivo en disco
+    key = ('hyper', source_digest(source), table)
+    df = data._frames.get(key)
+    if df is None:
+        if isinstance(source, (str, Path)):
+            df = read_hyper(source, table)
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / 'upload.hyper'
+                path.write_bytes(source.getvalue())
+                df = read_hyper(path, table)
+        data._frames.put(key, df)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export D4D files and their aggregates to Tableau .hyper files')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--out', default='.')
+    args = parser.parse_args(argv)
+    Path(args.out).mkdir(parents=True, exist_ok=True)
+    for path in args.paths:
+        t = time.time()
+        out = Path(args.out) / f'{Path(path).stem}.hyper'
+        counts = export_hyper(bi_tables(load_d4d(path)), out)
+        print(f'{out}: ' + ', '.join(f'{k} {v:,}' for k, v in counts.items()) + f' ({time.time() - t:.1f}s)')
+
+
+if __name__ == '__main__':
+    main()
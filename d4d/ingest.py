@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from d4d.data import csv_options, excel_frame, open_d4d
+from d4d.store import PART_COL, STORE_DIR, STORE_SCHEMA, ingest_staged
+
+### INGEST POR CHUNKS ###
+# tamano de bloque del lector pyarrow: la memoria maxima depende de esto, no del tamano del archivo
+BLOCK_SIZE = 16 * 1024 * 1024
+# sobre este tamano demo_1 propone el ingest por chunks
+STREAM_MIN_BYTES = 64 * 1024 * 1024
+PREVIEW_ROWS = 1000
+
+
+def iter_batches(source, block_size=BLOCK_SIZE):
+    # genera (record_batch tipado, fraccion leida) con los encabezados ya normalizados
+    src = open_d4d(source)
+    try:
+        if src.kind == 'excel':
+            # Excel no se puede leer por bloques; el archivo es chico (limite de ~1M filas por hoja)
+            yield pa.Table.from_pandas(excel_frame(src), schema=STORE_SCHEMA, preserve_index=False), 1.0
+            return
+        reader = pacsv.open_csv(src.stream(), **csv_options(src, block_size))
+        for batch in reader:
+            batch = pa.Table.from_batches([batch]).select(STORE_SCHEMA.names).cast(STORE_SCHEMA)
+            yield batch, min(src.position() / src.size, 1.0) if src.size else 1.0
+    finally:
+        src.close()
+
+
+def stream_ingest(source, root=STORE_DIR, block_size=BLOCK_SIZE, progress=None):
+    # lee el archivo por bloques y escribe cada bloque, separado por mes, en particiones de staging;
+    # al final cada mes entra al store con ingest_staged
+    Path(root).mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix='_staging_', dir=root))
+    writers = {}
+    preview = None
+    rows = 0
+    try:
+        for table, done in iter_batches(source, block_size):
+            if preview is None:
+                preview = table.slice(0, PREVIEW_ROWS).to_pandas()
+            meses = pc.strftime(table['fecha'], format='%Y-%m')
+            for mes in pc.unique(meses).to_pylist():
+                if mes not in writers:
+                    writers[mes] = pq.ParquetWriter(staging / f'{PART_COL}={mes}.parquet', STORE_SCHEMA)
+                writers[mes].write_table(table.filter(pc.equal(meses, mes)))
+            rows += table.num_rows
+            if progress is not None:
+                progress(done, rows)
+        for writer in writers.values():
+            writer.close()
+        added = {mes: ingest_staged(mes, staging / f'{PART_COL}={mes}.parquet', root) for mes in sorted(writers)}
+    finally:
+        for writer in writers.values():
+            writer.close()
+        shutil.rmtree(staging, ignore_errors=True)
+    return added, preview
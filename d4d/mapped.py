@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from d4d import data
+from d4d.data import parse_d4d, source_digest
+from d4d.store import STORE_DIR
+
+### REFERENCIA MAPEADA ###
+# archivos de referencia (ejemplo, regional) y sus agregados se convierten una vez a Arrow IPC sin compresion
+# y en un solo chunk; cada sesion y cada proceso los abre con memory map sin copiar, asi todos comparten las
+# mismas paginas fisicas del cache del sistema. Los frames resultantes son de solo lectura
+ARROW_DIR = STORE_DIR / '_arrow'
+# version de los constructores (parse_d4d, build_cube, build_benchmark): va en el nombre de cada archivo para que
+# un cambio de logica no sirva artefactos viejos. Subirla cada vez que cambie uno de ellos (2: build_cube con nulos)
+VERSION = 2
+
+_lock = threading.RLock()
+
+
+def write_ipc(df, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(df).combine_chunks()
+    tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+    feather.write_feather(table, tmp, compression='uncompressed', chunksize=max(table.num_rows, 1))
+    os.replace(tmp, path)
+
+
+def read_ipc(path):
+    # el memory map queda vivo mientras algun frame use sus buffers
+    table = pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def mapped(name, digest, build, root=ARROW_DIR):
+    path = root / f'{name}-v{VERSION}-{digest}.arrow'
+    if not path.exists():
+        with _lock:
+            if not path.exists():
+                write_ipc(build(), path)
+                _prune(name, root)
+    return read_ipc(path)
+
+
+def _prune(name, root):
+    # artefactos de versiones anteriores ya no se leen; los frames que aun los mapean siguen validos en linux
+    for path in root.glob(f'{name}-*.arrow'):
+        if not path.name.startswith(f'{name}-v{VERSION}-'):
+            path.unlink(missing_ok=True)
+
+
+def load_reference(source, root=ARROW_DIR):
+    # como load_d4d, pero el frame queda respaldado por el archivo mapeado y no por memoria de la sesion
+    digest = source_digest(source)
+    key = ('mapped', digest)
+    df = data._frames.get(key)
+    if df is None:
+        df = mapped('d4d', digest, lambda: parse_d4d(open(source, 'rb').read()), root)
+        data._frames.put(key, df)
+    return df
+
+
+def main(argv=None):
+    # conversion previa al deploy, para que ninguna sesion pague el parseo
+    from d4d.benchmark import load_benchmark
+    from d4d.cube import file_cube
+    parser = argparse.ArgumentParser(description='Convert reference D4D files and their aggregates to memory-mappable Arrow files')
+    parser.add_argument('paths', nargs='+')
+    args = parser.parse_args(argv)
+    for path in args.paths:
+        load_reference(path)
+        file_cube(path)
+        load_benchmark(path)
+        print(f'{path}: {ARROW_DIR}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from d4d.cube import rollup
+from d4d.data import derived
+from d4d.simulator import unit_economics
+
+### SIMULACION MONTE CARLO ###
+BATCH = 25_000
+# bajo este numero de trials se corre en el mismo proceso (el resultado es identico, mismas semillas por lote)
+POOL_MIN_TRIALS = 100_000
+QUANTILES = [.1, .5, .9]
+EPS = 1e-3
+# tablas de bandas recordadas por escenario (parametros, inputs, trials, semilla)
+BANDS_CACHE = 64
+
+_pool = None
+_pool_lock = threading.Lock()
+# lotes enviados al pool y aun no recogidos, para cancelarlos al salir
+_futures = set()
+_bands = OrderedDict()
+_bands_lock = threading.Lock()
+
+
+def fit_history(cube):
+    # parametros de demanda mensual de 1ra dosis y dispersion de la adherencia mensual (2da/1ra, 3ra/1ra)
+    monthly = rollup(cube, ['mes', 'dosis']).pivot(index='mes', columns='dosis', values='cantidad')
+    monthly = monthly.reindex(columns=['1ra', '2da', '3ra']).fillna(0)
+    d1 = monthly['1ra']
+    if d1.sum() == 0:
+        raise ValueError('No 1st doses in the data, adherence cannot be estimated')
+    params = {'d1_total': float(d1.sum()), 'd1_var': float(len(d1)*d1.var(ddof=0))}
+    for dose, name in [('2da', 'adh2'), ('3ra', 'adh3')]:
+        mean = float(np.clip(monthly[dose].sum()/d1.sum(), EPS, 1 - EPS))
+        ratios = (monthly[dose]/d1.where(d1 > 0)).dropna().clip(EPS, 1 - EPS)
+        var = float(ratios.var(ddof=0)) if len(ratios) > 1 else 0.
+        # concentracion de una beta con la misma varianza: var = m(1-m)/(k+1)
+        kappa = mean*(1 - mean)/var - 1 if var > 0 else 1e6
+        params[name] = mean
+        params[f'{name}_kappa'] = float(max(kappa, 2.))
+    return params
+
+
+def _beta(rng, mean, kappa, size):
+    mean = float(np.clip(mean, EPS, 1 - EPS))
+    return rng.beta(mean*kappa, (1 - mean)*kappa, size)
+
+
+def _demand(rng, params, size):
+    mean, var = params['d1_total'], params['d1_var']
+    if var <= 0:
+        return np.full(size, mean)
+    return rng.gamma(mean**2/var, var/mean, size)
+
+
+def _batch(args):
+    params, precio, costo, dcto, adh2, adh3, size, seed = args
+    rng = np.random.default_rng(seed)
+    d1 = _demand(rng, params, size)
+    current = d1*(1 + _beta(rng, params['adh2'], params['adh2_kappa'], size) + _beta(rng, params['adh3'], params['adh3_kappa'], size))
+    potential = d1*(1 + _beta(rng, adh2, params['adh2_kappa'], size) + _beta(rng, adh3, params['adh3_kappa'], size))
+    unit = float(unit_economics(precio, costo, dcto)['net_margin'])
+    doses = np.stack([current, potential, potential - current])
+    return np.stack([doses*precio, doses*unit])
+
+
+def _get_pool():
+    # spawn y no fork: el proceso padre es el servidor de streamlit, con hilos y sockets abiertos
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+@atexit.register
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            # cancel_futures solo existe desde python 3.9: los lotes pendientes se cancelan uno a uno
+            for future in list(_futures):
+                future.cancel()
+            _pool.shutdown(wait=False)
+            _pool = None
+
+
+def run_trials(params, precio, costo, dcto, adh2, adh3, trials=100_000, seed=0):
+    # devuelve un arreglo (metrica [ventas, margen], escenario [actual, potencial, oportunidad], trial)
+    sizes = [BATCH]*(trials//BATCH) + ([trials % BATCH] if trials % BATCH else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(params, precio, costo, dcto, adh2, adh3, size, s) for size, s in zip(sizes, seeds)]
+    if trials < POOL_MIN_TRIALS:
+        results = [_batch(job) for job in jobs]
+    else:
+        pool = _get_pool()
+        futures = [pool.submit(_batch, job) for job in jobs]
+        with _pool_lock:
+            _futures.update(futures)
+        try:
+            results = [future.result() for future in futures]
+        finally:
+            with _pool_lock:
+                _futures.difference_update(futures)
+    return np.concatenate(results, axis=-1)
+
+
+def history(cube):
+    return derived(cube, 'montecarlo', fit_history)
+
+
+def scenario_bands(params, precio, costo, dcto, adh2, adh3, trials=100_000, seed=0):
+    # mismo escenario y semilla dan las mismas bandas: un rerun sin cambios no vuelve a mandar trials al pool
+    key = (tuple(sorted(params.items())), precio, costo, dcto, adh2, adh3, trials, seed)
+    with _bands_lock:
+        if key in _bands:
+            _bands.move_to_end(key)
+            return _bands[key]
+    table = band_table(run_trials(params, precio, costo, dcto, adh2, adh3, trials, seed))
+    with _bands_lock:
+        _bands[key] = table
+        while len(_bands) > BANDS_CACHE:
+            _bands.popitem(last=False)
+    return table
+
+
+def band_table(samples):
+    rows = {}
+    for i, metric in enumerate(['Sales [CLP]', 'Margin [CLP]']):
+        bands = np.quantile(samples[i], QUANTILES, axis=-1)
+        for q, band in zip(QUANTILES, bands):
+            rows[f'{metric} P{int(q*100)}'] = band
+    return pd.DataFrame.from_dict(rows, columns=['Current', 'Potencial', 'Opportunity'], orient='index')
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from d4d import sql
+from d4d.data import load_d4d, source_digest
+from d4d.hyper import load_hyper
+from d4d.ingest import stream_ingest
+from d4d.store import ingest, load_store
+from d4d.validate import has_errors, validate
+
+### PRECOMPUTO EN SEGUNDO PLANO ###
+# al subir un archivo: validacion y guardado en el store, y despues, en paralelo, lo que leen analytics y
+# simulator (cubo, conteos por dosis, seguimiento, pronostico, benchmark, cohortes). Cada etapa llama a las
+# mismas funciones que las paginas, asi los resultados quedan en sus caches y las paginas abren en caliente.
+# Hilos y no procesos: los caches viven en el proceso del servidor de streamlit
+WORKERS = int(os.environ.get('D4D_PRECOMPUTE_WORKERS', 4))
+MAX_JOBS = 16
+# segundos entre actualizaciones del avance en la pagina de carga
+POLL = .25
+REFERENCE = 'g9_data_example.csv'
+BENCHMARK = 'g9_data_region.csv'
+STAGES = ['validate', 'store', 'data', 'cube', 'dose counts', 'follow-up', 'forecast', 'benchmark', 'cohorts']
+
+# un archivo a la vez (la ingesta escribe el store); las etapas de cada archivo se reparten en el pool
+_runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='d4d-upload')
+_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='d4d-precompute')
+_jobs = OrderedDict()
+_lock = threading.Lock()
+
+
+class Job:
+    # estado compartido de un archivo subido: estado y segundos por etapa, avance de la lectura y resultado de la ingesta
+    def __init__(self, key):
+        self.key = key
+        self.stages = OrderedDict((name, 'pending') for name in STAGES)
+        self.seconds = {}
+        self.read = 0.0
+        self.rows = 0
+        self.report = None
+        self.added = {}
+        self.preview = None
+        self.error = None
+        # archivo ya leido (queda en el cache de load_d4d/load_hyper): la pagina lo muestra sin volver a parsearlo
+        self.parsed = threading.Event()
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    def run(self, name, fn, *args, **kwargs):
+        with self.lock:
+            self.stages[name] = 'running'
+        t = time.perf_counter()
+        try:
+            value = fn(*args, **kwargs)
+        except Exception as e:
+            with self.lock:
+                self.stages[name] = 'failed'
+                self.error = self.error or f'{name}: {e!r}'
+            raise
+        with self.lock:
+            self.stages[name] = 'done'
+            self.seconds[name] = time.perf_counter() - t
+        return value
+
+    def skip(self, *names):
+        with self.lock:
+            for name in names:
+                if self.stages[name] == 'pending':
+                    self.stages[name] = 'skipped'
+
+    @property
+    def stored(self):
+        return self.stages['store'] == 'done'
+
+    def progress(self):
+        # fraccion terminada; la etapa store avanza con la lectura del archivo
+        with self.lock:
+            finished = sum(state in ('done', 'skipped', 'failed') for state in self.stages.values())
+            reading = self.read if self.stages['store'] == 'running' else 0
+            running = [name for name, state in self.stages.items() if state == 'running']
+        return min((finished + reading) / len(self.stages), 1.0), running
+
+    def status(self):
+        with self.lock:
+            return pd.DataFrame({'stage': list(self.stages), 'status': list(self.stages.values()),
+                                 'seconds': [round(self.seconds[s], 2) if s in self.seconds else None for s in self.stages]})
+
+
+def _precompute(job):
+    # mismas fuentes que las paginas: duckdb si esta activado, si no el store cargado en memoria.
+    # Imports diferidos: la pagina de carga importa este modulo y no debe pagar plotly ni scipy antes de dibujar
+    from d4d.benchmark import benchmark_table, load_benchmark
+    from d4d.cube import load_cube
+    from d4d.followup import followup_index
+    from d4d.forecast import load_forecast
+    from d4d.graph import cohorts, dose_counts
+    from d4d.mapped import load_reference
+    if sql.enabled():
+        job.skip('data')
+        parts = {'dose counts': _pool.submit(job.run, 'dose counts', sql.dose_counts),
+                 'follow-up': _pool.submit(job.run, 'follow-up', sql.SqlFollowUp)}
+        cube = _pool.submit(job.run, 'cube', sql.cube)
+    else:
+        df = _pool.submit(job.run, 'data', load_store)
+        cube = _pool.submit(job.run, 'cube', load_cube, REFERENCE)
+        df = df.result()
+        if df is None:
+            df = load_reference(REFERENCE)
+        parts = {'dose counts': _pool.submit(job.run, 'dose counts', dose_counts, df),
+                 'follow-up': _pool.submit(job.run, 'follow-up', followup_index, df)}
+    cube = cube.result()
+    parts['forecast'] = _pool.submit(job.run, 'forecast', load_forecast, cube)
+    parts['benchmark'] = _pool.submit(job.run, 'benchmark', lambda: benchmark_table(load_benchmark(BENCHMARK), cube))
+    parts['cohorts'] = _pool.submit(job.run, 'cohorts', lambda: [cohorts(cube, dose) for dose in ('2da', '3ra')])
+    for part in parts.values():
+        part.exception()
+
+
+def _run(job, file, hyper, streaming):
+    try:
+        # los .hyper ya vienen de datos validados
+        if hyper:
+            job.skip('validate')
+        else:
+            job.report = job.run('validate', validate, file)
+            if has_errors(job.report):
+                job.skip(*STAGES)
+                return
+        if streaming:
+            def progress(done, rows):
+                job.read, job.rows = done, rows
+            job.added, job.preview = job.run('store', stream_ingest, file, progress=progress)
+        else:
+            def store():
+                df = (load_hyper if hyper else load_d4d)(file)
+                job.parsed.set()
+                return ingest(df)
+            job.added = job.run('store', store)
+        _precompute(job)
+    except Exception:
+        # el error queda en job.error; las etapas que no alcanzaron a correr se marcan como omitidas
+        job.skip(*STAGES)
+    finally:
+        job.done.set()
+
+
+def start(file, hyper=False, streaming=False):
+    # un job por contenido del archivo: otra sesion que suba el mismo archivo mientras corre ve el mismo estado;
+    # uno ya terminado se vuelve a correr (la ingesta no duplica filas y las etapas salen del cache)
+    key = (source_digest(file), hyper, streaming)
+    with _lock:
+        job = _jobs.get(key)
+        if job is None or job.done.is_set():
+            job = Job(key)
+            _jobs[key] = job
+            _runner.submit(_run, job, file, hyper, streaming)
+        _jobs.move_to_end(key)
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+    return job
+
+
+def wait(job, timeout=None):
+    # las paginas esperan a un job en curso antes de leer el store
+    return job is None or job.done.wait(timeout)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import argparse
+import datetime
+import json
+import os
+import resource
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from d4d import data
+
+### PROFILING ###
+# tiempos por etapa de cada rerun: el panel del sidebar muestra el ultimo rerun y el log guarda todos
+# (una linea JSON por rerun). D4D_TIMINGS_LOG cambia la ruta del log; vacio lo desactiva
+LOG_PATH = os.environ.get('D4D_TIMINGS_LOG', str(Path(__file__).resolve().parents[1] / 'logs' / 'timings.jsonl'))
+LOG_MAX_BYTES = 50 * 1024 * 1024
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+def start_rerun(app):
+    # cada sesion de streamlit corre su script en su propio thread
+    _local.run = {'app': app, 'start': time.perf_counter(), 'last': time.perf_counter(), 'stages': []}
+
+
+def checkpoint(name):
+    # la etapa `name` es todo lo que corrio desde el checkpoint anterior
+    run = getattr(_local, 'run', None)
+    if run is None:
+        return
+    now = time.perf_counter()
+    run['stages'].append((name, now - run['last']))
+    run['last'] = now
+
+
+def _session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return get_script_run_ctx().session_id
+    except Exception:
+        return None
+
+
+def memory():
+    rss = None
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        pass
+    return {
+        'rss_mb': None if rss is None else round(rss, 1),
+        'rss_peak_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'arrow_mb': round(pa.total_allocated_bytes() / 2**20, 1),
+        'cache_mb': round(data._frames.nbytes / 2**20, 1),
+    }
+
+
+def export(record, path=LOG_PATH):
+    if not path:
+        return
+    path = Path(path)
+    line = json.dumps(record) + '\n'
+    with _log_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # rotacion simple: un solo archivo anterior (.1)
+        if path.exists() and path.stat().st_size > LOG_MAX_BYTES:
+            os.replace(path, path.with_suffix(path.suffix + '.1'))
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+def end_rerun(panel=True):
+    # cierra el rerun: exporta el registro y, si esta activado, muestra el panel en el sidebar
+    run = getattr(_local, 'run', None)
+    if run is None:
+        return None
+    _local.run = None
+    record = {
+        'ts': datetime.datetime.now().isoformat(timespec='milliseconds'),
+        'app': run['app'],
+        'session': _session_id(),
+        'total_s': round(time.perf_counter() - run['start'], 4),
+        'stages': {name: round(seconds, 4) for name, seconds in run['stages']},
+        **memory(),
+    }
+    export(record)
+    if panel and st.sidebar.checkbox('Show profiling', key='profiling'):
+        profile_panel(record)
+    return record
+
+
+def profile_panel(record):
+    with st.sidebar.expander('Last rerun', expanded=True):
+        _ = pd.DataFrame(list(record['stages'].items()), columns=['Stage', 'ms'])
+        _['ms'] = (_['ms'] * 1000).round(1)
+        st.metric('Total', f"{record['total_s'] * 1000:,.0f} ms")
+        st.dataframe(_, hide_index=True, use_container_width=True)
+        st.caption(f"RSS {record['rss_mb']} MB (peak {record['rss_peak_mb']} MB), Arrow {record['arrow_mb']} MB, load cache {record['cache_mb']} MB")
+
+
+### RESUMEN DEL LOG ###
+def summarize(path=LOG_PATH):
+    # percentiles por app y etapa, para encontrar las etapas lentas en produccion
+    records = [json.loads(line) for line in open(path, encoding='utf-8') if line.strip()]
+    rows = [(r['app'], stage, s) for r in records for stage, s in [*r['stages'].items(), ('total', r['total_s'])]]
+    df = pd.DataFrame(rows, columns=['app', 'stage', 'seconds'])
+    return df.groupby(['app', 'stage'], sort=False).seconds.describe(percentiles=[.5, .95])[['count', '50%', '95%', 'max']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize the per-rerun timing log of the apps')
+    parser.add_argument('path', nargs='?', default=LOG_PATH)
+    args = parser.parse_args(argv)
+    print(summarize(args.path).round(4).to_string())
+
+
+if __name__ == '__main__':
+    main()
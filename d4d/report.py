@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+import argparse
+import base64
+import io
+import numbers
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import matplotlib
+import pandas as pd
+from jinja2 import Template
+from matplotlib.figure import Figure
+
+from d4d import data
+from d4d.credit_notes import credit_notes
+from d4d.cube import build_cube, rollup
+from d4d.data import load_d4d
+from d4d.figures import top_n
+from d4d.followup import followup_index
+from d4d.forecast import fit_forecast, monthly_matrix, recommended_units
+from d4d.simulator import df_dosis, scenario, unit_economics
+
+### REPORTES BATCH ###
+# un reporte HTML/PDF por clinica (un archivo D4D por clinica) con los mismos calculos de las apps
+fig_palette = ['#00857C', '#6ECEB2', '#0C2340', '#BFED33', '#FFF063', '#69B8F7', '#688CE8', '#5450E4']
+INPUTS = {'precio': 130000, 'costo': 89500, 'dcto': .03, 'adh2': .8, 'adh3': .7}
+# los workers se reciclan cada TASKS_PER_WORKER clinicas (un pool nuevo por tanda) para que la memoria no crezca;
+# por tandas y no con max_tasks_per_child, que solo existe desde python 3.11
+TASKS_PER_WORKER = 50
+MAX_TABLE_ROWS = 200
+
+TEMPLATE = Template("""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{{ name }}</title>
+<style>
+body { font-family: sans-serif; color: #262730; margin: 2rem; }
+h1, h2 { color: #00857C; }
+table { border-collapse: collapse; margin-bottom: 1rem; font-size: 11px; }
+th, td { border: 1px solid #E2F5F0; padding: 3px 8px; text-align: right; }
+th { background: #E2F5F0; }
+.kpi { display: inline-block; width: 30%; text-align: center; font-size: 24px; }
+.kpi small { display: block; font-size: 12px; color: #6b6b6b; }
+.charts img { width: 48%; }
+</style></head>
+<body>
+<h1>{{ name }}</h1>
+<p>Data from {{ start }} to {{ end }}</p>
+<h2>Estimated adherence</h2>
+{% for label, p, n in kpis %}<div class="kpi">{{ label }}<br><b>{{ '%.0f' % (p*100) }}%</b><small>{{ n }} vaccinated</small></div>{% endfor %}
+<h2>Analytics</h2>
+<div class="charts">{% for chart in charts %}<img src="data:image/svg+xml;base64,{{ chart }}">{% endfor %}</div>
+<h2>Simulator</h2>
+{{ economics }}
+<h3>Current scenario</h3>{{ current }}
+<h3>Potencial scenario</h3>{{ potential }}
+<h3>Income Opportunity</h3>{{ opportunity }}
+<h2>Purchase recommendation</h2>
+<p>Recommended units for {{ forecast_month }}: <b>{{ units }}</b></p>
+<h2>Tracking - next doses ({{ periodo }})</h2>
+{% for name, rows in due %}<h3>{{ name }}: {{ rows[0] }}</h3>{{ rows[1] }}{% endfor %}
+<h2>Credit notes</h2>
+{{ credit }}
+</body></html>""")
+
+
+def _svg(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format='svg', bbox_inches='tight')
+    return base64.b64encode(buf.getvalue()).decode()
+
+
+def charts(cube):
+    # mismos roll-ups que df_charts, dibujados como SVG estatico (el PDF no ejecuta plotly.js)
+    # Figure directo, sin pyplot: no toca el backend global de quien importa este modulo
+    out = []
+    fig = Figure(figsize=(6, 3.5))
+    ax = fig.subplots()
+    rollup(cube, ['sexo', 'edad']).pivot(index='edad', columns='sexo', values='cantidad').plot.bar(ax=ax, color=fig_palette, rot=0)
+    ax.set_title('Vaccination by age and sex')
+    out.append(_svg(fig))
+    fig = Figure(figsize=(6, 3.5))
+    ax = fig.subplots()
+    df2 = top_n(rollup(cube, 'comuna'), 'comuna').sort_values('cantidad', ascending=False)
+    ax.pie(df2.cantidad, labels=df2.comuna.astype(str), colors=fig_palette, autopct='%1.0f%%')
+    ax.set_title('Distribution of districts')
+    out.append(_svg(fig))
+    fig = Figure(figsize=(6, 3.5))
+    ax = fig.subplots()
+    df3 = top_n(rollup(cube, 'especialidad'), 'especialidad').sort_values(by='cantidad')
+    ax.barh(df3.especialidad.astype(str), df3.cantidad, color=fig_palette[0])
+    ax.set_title('Specialty prescribers')
+    out.append(_svg(fig))
+    fig = Figure(figsize=(6, 3.5))
+    ax = fig.subplots()
+    df4 = rollup(cube, 'dosis').sort_values(by='cantidad', ascending=False)
+    ax.bar(df4.dosis.astype(str), df4.cantidad, color=fig_palette[0])
+    ax.set_title('Vaccinated by dose')
+    out.append(_svg(fig))
+    return out
+
+
+def _money(df):
+    return df.applymap(lambda x: '{:,}'.format(int(x)) if isinstance(x, numbers.Number) else x).to_html()
+
+
+def _table(rows, columns):
+    return pd.DataFrame.from_dict({k: list(v) if hasattr(v, '__len__') else [v] for k, v in rows.items()}, columns=columns, orient='index')
+
+
+def clinic_context(source, name, inputs=INPUTS):
+    df = load_d4d(source)
+    cube = build_cube(df)
+    dosis1_n, dosis1_p, dosis2_n, dosis2_p, dosis3_n, dosis3_p = df_dosis(df)
+    precio, costo, dcto, adh2, adh3 = (inputs[k] for k in ['precio', 'costo', 'dcto', 'adh2', 'adh3'])
+    eco = unit_economics(precio, costo, dcto)
+    sc = scenario((dosis1_n, dosis2_n, dosis3_n), precio, costo, dcto, adh2, adh3)
+    doses = ['1st dose', '2nd dose', '3rd dose']
+    economics = _table({'Price': precio, 'Tax': eco['tax'], 'Cost': costo, 'Margin': eco['margin'],
+                        'Discount': eco['discount'], 'Post discount margin': eco['net_margin']}, ['CLP'])
+    forecast = fit_forecast(monthly_matrix(cube))
+    seguimiento = followup_index(df)
+    periodo = seguimiento.periodos[0]
+    due = [(k, (len(v), v.head(MAX_TABLE_ROWS).to_html(index=False))) for k, v in seguimiento.due_rows(df, periodo).items()]
+    return {
+        'name': name,
+        'start': df.fecha.min().date(),
+        'end': df.fecha.max().date(),
+        'kpis': list(zip(doses, [dosis1_p, dosis2_p, dosis3_p], [dosis1_n, dosis2_n, dosis3_n])),
+        'charts': charts(cube),
+        'economics': _money(economics),
+        'current': _money(_table({'Sales [doses]': sc['current_doses'], 'Sales [CLP]': sc['current_sales'],
+                                  'Margin [CLP]': sc['current_margin']}, doses)),
+        'potential': _money(_table({'Sales [doses]': sc['potential_doses'], 'Sales [CLP]': sc['potential_sales'],
+                                    'Margin [CLP]': sc['potential_margin']}, doses)),
+        'opportunity': _money(_table({
+            'Sales [doses]': [sc['current_doses'].sum(), sc['potential_doses'].sum(), sc['opportunity_doses']],
+            'Sales [CLP]': [sc['current_sales'].sum(), sc['potential_sales'].sum(), sc['opportunity_sales']],
+            'Margin [CLP]': [sc['current_margin'].sum(), sc['potential_margin'].sum(), sc['opportunity_margin']],
+        }, ['Current', 'Potencial', 'Opportunity'])),
+        'forecast_month': forecast.columns[-1],
+        'units': int(recommended_units(forecast).iloc[0]),
+        'periodo': periodo,
+        'due': due,
+        'credit': credit_notes(df).drop(columns=['customer']).head(MAX_TABLE_ROWS).to_html(index=False),
+    }
+
+
+def render(source, out_dir, formats=('html',), inputs=INPUTS):
+    t = time.time()
+    name = Path(source).stem
+    html = TEMPLATE.render(**clinic_context(source, name, inputs))
+    paths = []
+    if 'html' in formats:
+        paths.append(Path(out_dir) / f'{name}.html')
+        paths[-1].write_text(html, encoding='utf-8')
+    if 'pdf' in formats:
+        from weasyprint import HTML
+        paths.append(Path(out_dir) / f'{name}.pdf')
+        HTML(string=html).write_pdf(paths[-1])
+    return name, [str(p) for p in paths], time.time() - t
+
+
+def _init_worker():
+    # los caches de carga no sirven entre clinicas distintas: se dejan en el minimo
+    data._frames.max_bytes = 0
+    # workers sin pantalla: el backend se fija aqui y no al importar el modulo
+    matplotlib.use('Agg')
+
+
+def clinic_files(paths):
+    files = []
+    for p in map(Path, paths):
+        files.extend(sorted(p.glob('*.csv')) if p.is_dir() else [p])
+    return files
+
+
+### BATCH ###
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render one HTML/PDF report per clinic D4D file')
+    parser.add_argument('paths', nargs='+', help='D4D files or directories with one file per clinic')
+    parser.add_argument('--out', default='reports')
+    parser.add_argument('--formats', nargs='+', default=['html', 'pdf'], choices=['html', 'pdf'])
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    for key, value in INPUTS.items():
+        parser.add_argument(f'--{key}', type=float, default=value)
+    args = parser.parse_args(argv)
+    Path(args.out).mkdir(parents=True, exist_ok=True)
+    inputs = {k: getattr(args, k) for k in INPUTS}
+    files = clinic_files(args.paths)
+    failed = 0
+    chunk = max(args.workers or 1, 1) * TASKS_PER_WORKER
+    for start in range(0, len(files), chunk):
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+            jobs = {pool.submit(render, str(f), args.out, args.formats, inputs): f for f in files[start:start + chunk]}
+            for job in as_completed(jobs):
+                try:
+                    name, paths, seconds = job.result()
+                    print(f'{name}: {", ".join(paths)} ({seconds:.1f}s)')
+                except Exception as e:
+                    failed += 1
+                    print(f'{jobs[job]}: FAILED {e!r}')
+    print(f'{len(files) - failed}/{len(files)} reports in {args.out}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
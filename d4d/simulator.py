@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+### MOTOR DE ESCENARIOS ###
+# todas las funciones aceptan escalares o arreglos numpy que se puedan combinar por broadcasting
+IVA = .19
+
+
+def df_dosis(df):
+    dosis1_n = df[df.dosis=='1ra'].cantidad.sum()
+    dosis1_p = 1
+    dosis2_n = df[df.dosis=='2da'].cantidad.sum()
+    dosis3_n = df[df.dosis=='3ra'].cantidad.sum()
+    # sin 1ras dosis la adherencia no esta definida: se informa 0 en vez de dividir por cero
+    dosis2_p = dosis2_n/dosis1_n if dosis1_n else 0
+    dosis3_p = dosis3_n/dosis1_n if dosis1_n else 0
+    return dosis1_n, dosis1_p, dosis2_n, dosis2_p, dosis3_n, dosis3_p
+
+
+def unit_economics(precio, costo, dcto):
+    precio, costo, dcto = (np.asarray(x, dtype=float) for x in (precio, costo, dcto))
+    margin = precio - precio*IVA - costo
+    discount = costo*dcto
+    return {
+        'tax': precio*IVA,
+        'margin': margin,
+        'discount': discount,
+        'net_margin': margin + discount,
+    }
+
+
+def scenario(dosis_n, precio, costo, dcto, adh2, adh3):
+    # dosis_n: (dosis1_n, dosis2_n, dosis3_n) observados; el ultimo eje de los resultados por dosis es [1ra, 2da, 3ra]
+    d1, d2, d3 = (np.asarray(x, dtype=float) for x in dosis_n)
+    adh2, adh3 = np.asarray(adh2, dtype=float), np.asarray(adh3, dtype=float)
+    precio = np.asarray(precio, dtype=float)
+    unit = unit_economics(precio, costo, dcto)['net_margin']
+    current = np.stack(np.broadcast_arrays(d1, d2, d3), axis=-1)
+    ratio = np.stack(np.broadcast_arrays(np.ones_like(adh2), adh2, adh3), axis=-1)
+    potential = d1[..., None]*ratio
+    current = np.broadcast_to(current, np.broadcast_shapes(potential.shape, current.shape))
+    opportunity = potential.sum(axis=-1) - current.sum(axis=-1)
+    return {
+        'current_doses': current,
+        'potential_doses': potential,
+        'current_sales': current*precio[..., None],
+        'potential_sales': potential*precio[..., None],
+        'current_margin': unit[..., None]*current,
+        'potential_margin': (unit*d1)[..., None]*ratio,
+        'opportunity_doses': opportunity,
+        'opportunity_sales': opportunity*precio,
+        'opportunity_margin': opportunity*unit,
+    }
+
+
+def scenario_grid(dosis_n, precio, costo, dcto, adh2, adh3):
+    # producto cartesiano de los ejes (cada uno escalar o 1-D) evaluado en una sola llamada;
+    # los resultados tienen forma (precio, costo, dcto, adh2, adh3[, dosis])
+    axes = [np.atleast_1d(np.asarray(x, dtype=float)) for x in (precio, costo, dcto, adh2, adh3)]
+    return scenario(dosis_n, *np.ix_(*axes))
+
+
+def break_even_price(costo, dcto):
+    # precio bruto desde el que el margen post descuento deja de ser negativo
+    return np.asarray(costo, dtype=float)*(1 - np.asarray(dcto, dtype=float))/(1 - IVA)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from d4d.cube import DIMS
+from d4d.data import CATEGORIES, COLUMNS, DATE_FORMAT, SEP, FrameCache
+from d4d.followup import NEXT_DOSE, month_to_periodo, periodo_to_month
+from d4d.store import PART_COL, STORE_DIR, list_months, store_fingerprint
+
+### MOTOR SQL (OPCIONAL) ###
+# mismas agregaciones que cube, df_dosis y el seguimiento, como consultas DuckDB sobre el store parquet o un CSV D4D:
+# solo se leen las columnas y particiones necesarias y la agregacion corre por bloques (con disco si no cabe en RAM),
+# asi extractos nacionales mas grandes que la memoria se consultan sin cargarlos. Se activa con D4D_BACKEND=duckdb;
+# duckdb se importa solo al usarlo
+BACKEND = os.environ.get('D4D_BACKEND', 'pandas')
+MEMORY_LIMIT = os.environ.get('D4D_DUCKDB_MEMORY', '2GB')
+MAX_RESULTS = 32
+
+_local = threading.local()
+# una entrada por (consulta, fuente) con la huella de la fuente: un store o CSV modificado reemplaza su resultado
+# en vez de acumular versiones viejas, y las fuentes menos usadas salen por LRU
+_memo = FrameCache(max_bytes=None, max_entries=MAX_RESULTS)
+
+
+def enabled(root=STORE_DIR):
+    return BACKEND == 'duckdb' and bool(list_months(root))
+
+
+def connect():
+    # una conexion por thread: cada sesion de streamlit corre en su propio thread
+    con = getattr(_local, 'con', None)
+    if con is None:
+        import duckdb
+        tmp = STORE_DIR / '_duckdb_tmp'
+        tmp.mkdir(parents=True, exist_ok=True)
+        con = duckdb.connect(config={'memory_limit': MEMORY_LIMIT, 'temp_directory': str(tmp)})
+        _local.con = con
+    return con
+
+
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def relation(source=None, root=STORE_DIR):
+    # FROM del store (particiones hive mes=YYYY-MM) o de un CSV D4D con las columnas posicionales de siempre
+    if source is None:
+        return f"read_parquet({_literal(Path(root) / f'{PART_COL}=*' / '*.parquet')}, hive_partitioning = true)"
+    names = ', '.join(_literal(c) for c in COLUMNS)
+    return (f"read_csv({_literal(source)}, delim = {_literal(SEP)}, header = true, names = [{names}], "
+            f"encoding = 'latin-1', dateformat = {_literal(DATE_FORMAT)}, "
+            f"types = {{'fecha': 'DATE', 'cantidad': 'INTEGER'}})")
+
+
+def _typed(df):
+    for col in set(df.columns) & (set(CATEGORIES) | {'mes'}):
+        df[col] = df[col].astype('category')
+    return df
+
+
+def _cached(name, source, root, build):
+    key = (name, source, str(root))
+    fingerprint = store_fingerprint(root) if source is None else os.stat(source).st_mtime_ns
+    known = _memo.get(key)
+    if known is not None and known[0] == fingerprint:
+        return known[1]
+    result = build()
+    _memo.put(key, (fingerprint, result))
+    return result
+
+
+def cube(source=None, root=STORE_DIR):
+    # mismo cubo que build_cube: cantidad por mes y dimensiones
+    query = (f"SELECT strftime(fecha, '%Y-%m') AS mes, {', '.join(DIMS)}, sum(cantidad)::BIGINT AS cantidad "
+             f"FROM {relation(source, root)} GROUP BY ALL ORDER BY ALL")
+    return _cached('cube', source, root, lambda: _typed(connect().execute(query).df()))
+
+
+def dose_counts(source=None, root=STORE_DIR):
+    # mismos valores que df_dosis
+    def build():
+        rows = connect().execute(f"SELECT dosis, sum(cantidad) FROM {relation(source, root)} GROUP BY dosis").fetchall()
+        n = {dosis: np.int64(total) for dosis, total in rows}
+        dosis1_n, dosis2_n, dosis3_n = (n.get(d, np.int64(0)) for d in ['1ra', '2da', '3ra'])
+        if not dosis1_n:
+            return dosis1_n, 1, dosis2_n, 0, dosis3_n, 0
+        return dosis1_n, 1, dosis2_n, dosis2_n/dosis1_n, dosis3_n, dosis3_n/dosis1_n
+    return _cached('dosis', source, root, build)
+
+
+class SqlFollowUp:
+    # misma interfaz que FollowUpIndex (periodos, due_rows); cada periodo es una consulta filtrada por fecha,
+    # que en el store solo lee la particion del mes correspondiente
+    def __init__(self, source=None, root=STORE_DIR):
+        self.source, self.root = source, root
+        months = _cached('periodos', source, root, lambda: connect().execute(
+            f"SELECT DISTINCT year(fecha)*12 + month(fecha) - 1 + 2 AS m FROM {relation(source, root)} ORDER BY m DESC"
+        ).fetchnumpy()['m'])
+        self.periodos = month_to_periodo(months.astype(int))
+
+    def due_rows(self, df, periodo):
+        # df: no se usa, los datos se consultan al store (misma firma que FollowUpIndex.due_rows)
+        out = {}
+        for name, (dosis, lag) in NEXT_DOSE.items():
+            month = periodo_to_month(periodo) - lag
+            start = pd.Timestamp(year=month//12, month=month % 12 + 1, day=1)
+            where = f"dosis = {_literal(dosis)} AND fecha >= DATE {_literal(start.date())} AND fecha < DATE {_literal((start + pd.DateOffset(months=1)).date())}"
+            if self.source is None:
+                where += f" AND {PART_COL} = {_literal(start.strftime('%Y-%m'))}"
+            rows = connect().execute(f"SELECT {', '.join(COLUMNS)} FROM {relation(self.source, self.root)} WHERE {where}").df()
+            rows['fecha'] = pd.to_datetime(rows.fecha)
+            rows['cantidad'] = rows.cantidad.astype('int32')
+            out[name] = _typed(rows)
+        return out
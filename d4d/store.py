@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from d4d.data import CATEGORIES, COLUMNS, FrameCache, arrow_schema, file_digest
+
+### STORE ###
+# dataset parquet compartido por todas las apps, particionado por mes de fecha (mes=YYYY-MM)
+STORE_DIR = Path(__file__).resolve().parents[1] / 'd4d_store'
+PART_COL = 'mes'
+STORE_SCHEMA = pa.schema([(col, arrow_schema()[col]) for col in COLUMNS])
+# filas por bloque al mezclar un mes subido por chunks con una particion existente
+MERGE_BATCH_ROWS = 64 * 1024
+
+_lock = threading.Lock()
+_frames = FrameCache(max_bytes=512 * 1024 * 1024)
+
+
+def month_of(fecha):
+    return fecha.dt.strftime('%Y-%m')
+
+
+def partition_path(mes, root=STORE_DIR):
+    return Path(root) / f'{PART_COL}={mes}' / 'part-0.parquet'
+
+
+def list_months(root=STORE_DIR):
+    root = Path(root)
+    if not root.exists():
+        return []
+    return sorted(p.name.split('=', 1)[1] for p in root.glob(f'{PART_COL}=*') if (p / 'part-0.parquet').exists())
+
+
+def _occurrence(df):
+    # numera filas identicas para deduplicar como multiconjunto: un re-upload no duplica,
+    # pero dos registros iguales dentro del mismo archivo se conservan
+    return df.groupby(COLUMNS, observed=True, sort=False, dropna=False).cumcount()
+
+
+def _write_partition(df, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    pq.write_table(pa.Table.from_pandas(df[COLUMNS], schema=STORE_SCHEMA, preserve_index=False), tmp)
+    os.replace(tmp, path)
+
+
+def ingest(df, root=STORE_DIR):
+    # agrega un frame limpio al store; solo reescribe las particiones de los meses presentes en df
+    df = df[COLUMNS]
+    meses = month_of(df.fecha)
+    added = {}
+    with _lock:
+        for mes, new in df.groupby(meses, sort=True):
+            path = partition_path(mes, root)
+            if path.exists():
+                old = pq.read_table(path).to_pandas()
+                new = new.assign(_n=_occurrence(new))
+                old = old.assign(_n=_occurrence(old))
+                merged = pd.concat([old, new], ignore_index=True)
+                merged = merged.drop_duplicates(subset=COLUMNS + ['_n']).drop(columns='_n')
+                added[mes] = len(merged) - len(old)
+                if added[mes] == 0:
+                    continue
+            else:
+                merged = new
+                added[mes] = len(new)
+            for col in CATEGORIES:
+                merged[col] = merged[col].astype(object).astype('category')
+            _write_partition(merged.sort_values('fecha', kind='stable'), path)
+    return added
+
+
+def _row_hashes(df):
+    return pd.util.hash_pandas_object(df[COLUMNS], index=False).to_numpy()
+
+
+def _batches(path, batch_size):
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield pa.Table.from_batches([batch]).cast(STORE_SCHEMA)
+
+
+def _merge_staged(staged, path):
+    # misma semantica de multiconjunto que ingest, por bloques: de cada fila nueva se agregan solo las
+    # ocurrencias que pasan las que ya tiene la particion. En memoria quedan solo los hashes de las filas
+    batch_size = MERGE_BATCH_ROWS
+    old = pd.Series(np.concatenate([_row_hashes(t.to_pandas()) for t in _batches(path, batch_size)] or [np.zeros(0, 'uint64')]))
+    old = old.value_counts()
+    seen = pd.Series(dtype='int64')
+    tmp = path.with_suffix('.tmp')
+    added = 0
+    with pq.ParquetWriter(tmp, STORE_SCHEMA) as writer:
+        for table in _batches(path, batch_size):
+            writer.write_table(table)
+        for table in _batches(staged, batch_size):
+            h = pd.Series(_row_hashes(table.to_pandas()))
+            # numero de ocurrencia de cada fila contando los bloques anteriores del archivo subido
+            n = seen.reindex(h).fillna(0).to_numpy() + h.groupby(h).cumcount().to_numpy()
+            keep = n >= old.reindex(h).fillna(0).to_numpy()
+            seen = seen.add(h.value_counts(), fill_value=0)
+            if keep.any():
+                writer.write_table(table.filter(pa.array(keep)))
+                added += int(keep.sum())
+    if added:
+        os.replace(tmp, path)
+    else:
+        os.remove(tmp)
+    return added
+
+
+def ingest_staged(mes, staged, root=STORE_DIR):
+    # particion armada por el ingest por chunks: si el mes es nuevo se mueve tal cual,
+    # si ya existia se mezcla por bloques, sin cargar el mes completo en memoria
+    path = partition_path(mes, root)
+    with _lock:
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staged, path)
+            return pq.ParquetFile(path).metadata.num_rows
+        added = _merge_staged(staged, path)
+    os.remove(staged)
+    return added
+
+
+def store_fingerprint(root=STORE_DIR):
+    stamps = []
+    for mes in list_months(root):
+        st_ = os.stat(partition_path(mes, root))
+        stamps.append(f'{mes}:{st_.st_mtime_ns}:{st_.st_size}')
+    return file_digest('|'.join(stamps).encode())
+
+
+def read_store(columns=None, months=None, root=STORE_DIR):
+    # lectura con poda de columnas y filtro por particion
+    dataset = ds.dataset(root, format='parquet', partitioning='hive')
+    filter_ = ds.field(PART_COL).isin(list(months)) if months is not None else None
+    cols = list(columns) if columns is not None else COLUMNS
+    df = dataset.to_table(columns=cols, filter=filter_).to_pandas()
+    for col in set(cols) & set(CATEGORIES):
+        df[col] = df[col].astype('category')
+    if 'cantidad' in df:
+        df['cantidad'] = df.cantidad.astype('int32')
+    return df
+
+
+def load_store(columns=None, months=None, root=STORE_DIR):
+    # memoizado por contenido del store: mientras no haya ingestas nuevas no se relee nada
+    if not list_months(root):
+        return None
+    key = (store_fingerprint(root), tuple(columns or ()), tuple(months or ()), months is None)
+    df = _frames.get(key)
+    if df is None:
+        df = read_store(columns, months, root)
+        _frames.put(key, df)
+    return df
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import argparse
+import io
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from d4d.data import DATE_FORMAT, ENCODING, SEP, load_d4d
+
+### DATOS SINTETICOS ###
+# archivos D4D con el mismo esquema, encoding y secuencia de dosis que los reales, a cualquier escala;
+# las frecuencias de cada categoria y la adherencia se toman del archivo de referencia
+REFERENCE = Path(__file__).resolve().parents[1] / 'g9_data_example.csv'
+HEADER = ['Fecha Vacunación', 'Especialidad Prescribe', 'Region', 'id_region', 'Comuna', 'Sexo', 'Rango Etario', 'Dosis', 'Cantidad']
+CHUNK_ROWS = 1_000_000
+# dias entre dosis (media, desviacion): 2da ~2 meses despues de la 1ra, 3ra ~4 meses despues de la 2da
+GAPS = {'2da': (60, 10), '3ra': (120, 15)}
+
+
+def reference_model(source=REFERENCE):
+    df = load_d4d(source)
+    model = {}
+    for cols in [['especialidad'], ['region', 'id_region', 'comuna'], ['sexo'], ['edad']]:
+        freq = df.groupby(cols, observed=True).cantidad.sum()
+        model[tuple(cols)] = (freq.index.to_frame(index=False), (freq/freq.sum()).to_numpy())
+    doses = df.groupby('dosis', observed=True).cantidad.sum()
+    model['p2'] = min(doses.get('2da', 0)/doses['1ra'], 1.)
+    model['p3'] = min(doses.get('3ra', 0)/max(doses.get('2da', 0), 1), 1.)
+    return model
+
+
+def _patients(rng, model, n, start, days):
+    # n pacientes: atributos comunes a sus dosis y fechas de 1ra, 2da y 3ra (NaT si no vuelve)
+    cols = {}
+    for key, value in model.items():
+        if isinstance(key, tuple):
+            frame, p = value
+            pick = rng.choice(len(p), size=n, p=p)
+            for col in key:
+                cols[col] = frame[col].astype(str).to_numpy()[pick]
+    first = start + rng.integers(0, days, n).astype('timedelta64[D]')
+    gap2 = np.maximum(rng.normal(*GAPS['2da'], n), 28).astype(int).astype('timedelta64[D]')
+    gap3 = np.maximum(rng.normal(*GAPS['3ra'], n), 56).astype(int).astype('timedelta64[D]')
+    second = np.where(rng.random(n) < model['p2'], first + gap2, np.datetime64('NaT'))
+    third = np.where(~np.isnat(second) & (rng.random(n) < model['p3']), second + gap3, np.datetime64('NaT'))
+    return cols, [('1ra', first), ('2da', second), ('3ra', third)]
+
+
+def _chunk(rng, model, rows, start, days):
+    expected = 1 + model['p2'] + model['p2']*model['p3']
+    n = max(int(rows/expected*1.05) + 10, 1)
+    cols, doses = _patients(rng, model, n, start, days)
+    end = start + np.timedelta64(days, 'D')
+    parts = {c: [] for c in ['fecha', 'especialidad', 'region', 'id_region', 'comuna', 'sexo', 'edad', 'dosis']}
+    for dosis, fecha in doses:
+        ok = ~np.isnat(fecha) & (fecha < end)
+        parts['fecha'].append(fecha[ok])
+        for col in ['especialidad', 'region', 'id_region', 'comuna', 'sexo', 'edad']:
+            parts[col].append(cols[col][ok])
+        parts['dosis'].append(np.full(ok.sum(), dosis))
+    # las dosis quedan agrupadas (todas las 1ra, luego 2da, 3ra): se permutan antes de cortar en `rows`
+    # para no perder las ultimas dosis ni dejar el bloque ordenado por dosis
+    keep = rng.permutation(sum(map(len, parts['fecha'])))[:rows]
+    table = {col: np.concatenate(v)[keep] for col, v in parts.items()}
+    fechas = pc.strftime(pa.array(table.pop('fecha').astype('datetime64[s]')), format=DATE_FORMAT)
+    return pa.table([fechas] + [pa.array(v) for v in table.values()] + [pa.array(np.ones(len(fechas), dtype='int32'))],
+                    names=['fecha'] + list(table) + ['cantidad'])
+
+
+def generate(path, rows, seed=0, start='2020-01-01', months=48, source=REFERENCE, chunk_rows=CHUNK_ROWS):
+    # escribe `rows` filas D4D en `path` por bloques (memoria acotada por chunk_rows)
+    rng = np.random.default_rng(seed)
+    model = reference_model(source)
+    start = np.datetime64(start, 'D')
+    days = int(((start.astype('datetime64[M]') + months).astype('datetime64[D]') - start).astype(int))
+    written = 0
+    with open(path, 'wb') as f:
+        f.write((SEP.join(HEADER) + '\n').encode(ENCODING))
+        while written < rows:
+            table = _chunk(rng, model, min(chunk_rows, rows - written), start, days)
+            buf = io.BytesIO()
+            pacsv.write_csv(table, buf, write_options=pacsv.WriteOptions(include_header=False, delimiter=SEP, quoting_style='none'))
+            f.write(buf.getvalue().decode('utf-8').encode(ENCODING))
+            written += table.num_rows
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic D4D file')
+    parser.add_argument('out')
+    parser.add_argument('--rows', type=float, default=1e6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', default='2020-01-01')
+    parser.add_argument('--months', type=int, default=48)
+    args = parser.parse_args(argv)
+    n = generate(args.out, int(args.rows), args.seed, args.start, args.months)
+    print(f'{n:,} rows -> {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+
+from d4d.data import FrameCache, derived, frame_digest
+
+### TABLA PAGINADA ###
+# los datos quedan en el servidor como tabla arrow; filtro y orden se calculan sobre las columnas
+# y al navegador solo se envia la pagina visible. Tablas y consultas se cachean por huella del contenido:
+# los frames de seguimiento se arman de nuevo en cada rerun (iloc) y su id no sirve como llave
+PAGE_SIZES = [50, 100, 500, 1000]
+_tables = FrameCache(max_bytes=256 * 1024 * 1024, sizeof=lambda table: table.nbytes)
+_queries = OrderedDict()
+_queries_lock = threading.Lock()
+MAX_QUERIES = 64
+
+
+def table_key(df):
+    # huella recordada por frame: el frame cacheado de la carga no se vuelve a hashear en cada rerun
+    return derived(df, 'digest', frame_digest)
+
+
+def to_arrow(df, key=None):
+    key = key or table_key(df)
+    table = _tables.get(key)
+    if table is None:
+        table = pa.Table.from_pandas(df, preserve_index=False).unify_dictionaries().combine_chunks()
+        _tables.put(key, table)
+    return table
+
+
+def _as_strings(col):
+    # (valores como texto, indices) para columnas diccionario; asi el filtro y el orden trabajan sobre las categorias
+    col = col.combine_chunks() if isinstance(col, pa.ChunkedArray) else col
+    if pa.types.is_dictionary(col.type):
+        return col.dictionary.cast(pa.string()), col.indices
+    return col.cast(pa.string()), None
+
+
+def filter_mask(table, column, text):
+    values, indices = _as_strings(table[column])
+    mask = pc.match_substring(values, text, ignore_case=True)
+    return pc.fill_null(mask if indices is None else pc.take(mask, indices), False)
+
+
+def sort_key(table, column):
+    col = table[column].combine_chunks()
+    if pa.types.is_dictionary(col.type):
+        return pc.take(pc.rank(col.dictionary, sort_keys='ascending'), col.indices)
+    return col
+
+
+def query(table, key, filter_column=None, filter_text='', sort_column=None, ascending=True):
+    # posiciones de las filas visibles, en orden; memoizado por huella de la tabla (key) y parametros
+    key = (key, filter_column, filter_text, sort_column, ascending)
+    with _queries_lock:
+        if key in _queries:
+            _queries.move_to_end(key)
+            return _queries[key]
+    rows = pa.array(np.arange(table.num_rows, dtype=np.int64)) if filter_column is None or not filter_text else None
+    if rows is None:
+        rows = pc.indices_nonzero(filter_mask(table, filter_column, filter_text))
+    if sort_column is not None:
+        keys = pa.table({'k': pc.take(sort_key(table, sort_column), rows)})
+        rows = pc.take(rows, pc.sort_indices(keys, sort_keys=[('k', 'ascending' if ascending else 'descending')]))
+    with _queries_lock:
+        _queries[key] = rows
+        while len(_queries) > MAX_QUERIES:
+            _queries.popitem(last=False)
+    return rows
+
+
+def page(table, rows, number, size):
+    start = (number - 1)*size
+    return table.take(rows[start:start + size]).to_pandas()
+
+
+def paged_table(df, key, page_size=100):
+    # reemplazo de st.write(df) para frames grandes
+    digest = table_key(df)
+    table = to_arrow(df, digest)
+    columns = table.column_names
+    c1, c2, c3, c4, c5 = st.columns([2, 3, 2, 1, 1])
+    with c1:
+        filter_column = st.selectbox('Filter column', columns, key=f'{key}_fcol')
+    with c2:
+        filter_text = st.text_input('Contains', key=f'{key}_ftext')
+    with c3:
+        sort_column = st.selectbox('Sort by', [None] + columns, key=f'{key}_scol', format_func=lambda x: '-' if x is None else x)
+    with c4:
+        ascending = st.toggle('Asc.', value=True, key=f'{key}_asc')
+    with c5:
+        size = st.selectbox('Rows', PAGE_SIZES, index=PAGE_SIZES.index(page_size) if page_size in PAGE_SIZES else 1, key=f'{key}_size')
+    rows = query(table, digest, filter_column, filter_text, sort_column, ascending)
+    pages = max(math.ceil(len(rows)/size), 1)
+    if st.session_state.get(f'{key}_page', 1) > pages:
+        st.session_state[f'{key}_page'] = 1
+    number = st.number_input(f'Page (of {pages:,})', min_value=1, max_value=pages, step=1, key=f'{key}_page')
+    st.dataframe(page(table, rows, int(number), size), use_container_width=True, hide_index=True)
+    start = (int(number) - 1)*size
+    st.caption(f'Rows {min(start + 1, len(rows)):,}-{min(start + size, len(rows)):,} of {len(rows):,} (total {table.num_rows:,})')
+    return len(rows)
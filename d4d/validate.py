@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from d4d.data import COLUMNS, DATE_FORMATS, HEADERS, normalize_header, open_d4d
+
+### VALIDACION ###
+# chequeos vectorizados sobre todo el archivo, leido por bloques como texto: el resultado es un reporte
+# compacto con una fila por chequeo y columna, y los indices (0 = primera fila de datos) de las filas que fallan.
+# Los errores impiden cargar el archivo; las advertencias solo se informan
+BLOCK_SIZE = 16 * 1024 * 1024
+DOSES = ['1ra', '2da', '3ra']
+# comunas de referencia con su region (extensible: una fila por comuna)
+REFERENCE = Path(__file__).resolve().parent / 'comunas.csv'
+REPORT_COLUMNS = ['check', 'severity', 'column', 'n', 'rows']
+ERROR, WARNING = 'error', 'warning'
+
+
+def load_reference(path=REFERENCE):
+    ref = pd.read_csv(path, sep=';', encoding='utf-8', dtype=str)
+    for col in ref:
+        ref[col] = ref[col].map(normalize_header)
+    return ref
+
+
+def _encode(col):
+    # codigos por fila y diccionario de valores unicos: cada chequeo corre una vez por valor distinto
+    encoded = pc.dictionary_encode(pc.utf8_trim_whitespace(col)).combine_chunks()
+    return encoded.indices.to_numpy(zero_copy_only=False), encoded.dictionary
+
+
+def _normalized(values):
+    return pd.Series(values.to_pylist(), dtype=object).map(lambda x: normalize_header(x) if x else '').to_numpy()
+
+
+def _valid_dates(values):
+    # strptime de arrow acepta fechas imposibles (31-02 -> 03-03): solo vale si la fecha vuelve al mismo texto
+    valid = np.zeros(len(values), dtype=bool)
+    for f in DATE_FORMATS:
+        parsed = pc.strptime(values, format=f, unit='s', error_is_null=True)
+        valid |= pc.fill_null(pc.equal(pc.strftime(parsed, format=f), values), False).to_numpy(zero_copy_only=False)
+    return valid
+
+
+def _row_hash(codes, values):
+    # hash por fila consistente entre bloques: se hashean los valores unicos y se combinan por columna
+    h = np.zeros(len(codes[0]), dtype=np.uint64)
+    for c, v in zip(codes, values):
+        hv = pd.util.hash_array(np.asarray(v.to_pylist(), dtype=object))
+        h = (h * np.uint64(1000003)) ^ hv[c]
+    return h
+
+
+class Report:
+    def __init__(self):
+        self.found = {}
+
+    def add(self, check, severity, column, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows):
+            self.found.setdefault((check, severity, column), []).append(rows)
+
+    def note(self, check, severity, column, n=1):
+        # problema del archivo completo, sin filas asociadas
+        self.found.setdefault((check, severity, column), []).append(np.full(n, -1, dtype=np.int64))
+
+    def frame(self):
+        rows = []
+        for (check, severity, column), parts in self.found.items():
+            idx = np.concatenate(parts)
+            rows.append((check, severity, column, len(idx), idx[idx >= 0]))
+        report = pd.DataFrame(rows, columns=REPORT_COLUMNS)
+        order = report.severity.map({ERROR: 0, WARNING: 1})
+        return report.assign(_o=order).sort_values(['_o', 'check'], kind='stable').drop(columns='_o').reset_index(drop=True)
+
+
+def _header(header, report):
+    mapped = [HEADERS.get(normalize_header(h)) for h in header]
+    if None in mapped and len(mapped) == len(COLUMNS):
+        # encabezado no reconocido pero con 9 columnas: se asume el orden posicional de df_clean
+        report.note('positional header', WARNING, '')
+        mapped = list(COLUMNS)
+    for raw, col in zip(header, mapped):
+        if col is None:
+            report.note('unknown column', ERROR, raw.strip().strip('"'))
+    for col in COLUMNS:
+        if col not in mapped:
+            report.note('missing column', ERROR, col)
+    return [c if c is not None else f'_extra{i}' for i, c in enumerate(mapped)]
+
+
+def _excel(src):
+    # hoja completa como texto; las celdas de fecha vuelven al formato D4D
+    df = pd.read_excel(src.open_file())
+    for col in df.select_dtypes('datetime'):
+        df[col] = df[col].dt.strftime(DATE_FORMATS[0])
+    return df.astype(object).where(df.notna(), '').astype(str)
+
+
+def _batches(src, names, report, block_size, excel=None):
+    if excel is not None:
+        excel.columns = names
+        yield pa.Table.from_pandas(excel, preserve_index=False)
+        return
+    malformed = []
+
+    def invalid(row):
+        malformed.append(row.text)
+        return 'skip'
+
+    reader = pacsv.open_csv(
+        src.stream(),
+        read_options=pacsv.ReadOptions(encoding=src.encoding, column_names=names, skip_rows=1, block_size=block_size),
+        parse_options=pacsv.ParseOptions(delimiter=src.delimiter, invalid_row_handler=invalid),
+        convert_options=pacsv.ConvertOptions(column_types={n: pa.string() for n in names}),
+    )
+    for batch in reader:
+        yield pa.Table.from_batches([batch])
+    if malformed:
+        report.note('malformed row', ERROR, '', len(malformed))
+
+
+def _check_batch(table, offset, report, ref, hashes):
+    index = np.arange(offset, offset + table.num_rows)
+    cols = [c for c in COLUMNS if c in table.column_names]
+    codes, values = {}, {}
+    for col in cols:
+        codes[col], values[col] = _encode(table[col])
+        empty = pc.equal(values[col], '').to_numpy(zero_copy_only=False)
+        report.add('missing value', ERROR, col, index[empty[codes[col]]])
+    checks = [
+        ('invalid date', 'fecha', _valid_dates),
+        ('invalid dose', 'dosis', lambda v: pc.is_in(v, pa.array(DOSES)).to_numpy(zero_copy_only=False)),
+        ('invalid cantidad', 'cantidad', lambda v: pc.match_substring_regex(v, r'^-?\d+$').to_numpy(zero_copy_only=False)),
+    ]
+    for check, col, fn in checks:
+        bad = ~fn(values[col]) & pc.not_equal(values[col], '').to_numpy(zero_copy_only=False)
+        report.add(check, ERROR, col, index[bad[codes[col]]])
+    negative = pc.match_substring_regex(values['cantidad'], r'^-\d+$').to_numpy(zero_copy_only=False)
+    report.add('negative cantidad', ERROR, 'cantidad', index[negative[codes['cantidad']]])
+    # region esperada para cada id_region y comuna conocida; las comunas fuera de la referencia no se juzgan
+    got = _normalized(values['region'])[codes['region']]
+    for col, check in [('id_region', 'region/id_region mismatch'), ('comuna', 'comuna/region mismatch')]:
+        expected = dict(zip(ref[col], ref.region))
+        exp = np.array([expected.get(v, '') for v in _normalized(values[col])], dtype=object)[codes[col]]
+        report.add(check, WARNING, col, index[(exp != '') & (exp != got)])
+    hashes.append(_row_hash([codes[c] for c in cols], [values[c] for c in cols]))
+    return int(np.count_nonzero(pc.equal(values['dosis'], '1ra').to_numpy(zero_copy_only=False)[codes['dosis']]))
+
+
+def validate(source, reference=REFERENCE, block_size=BLOCK_SIZE):
+    # source: ruta, archivo subido o bytes, en cualquiera de los formatos de d4d/formats.py
+    report = Report()
+    ref = load_reference(reference)
+    src = open_d4d(source)
+    try:
+        excel = _excel(src) if src.kind == 'excel' else None
+        names = _header(list(excel.columns) if excel is not None else src.header, report)
+        if any(check == 'missing column' for check, _, _ in report.found):
+            return report.frame()
+        hashes = []
+        offset = first_doses = 0
+        for table in _batches(src, names, report, block_size, excel):
+            first_doses += _check_batch(table, offset, report, ref, hashes)
+            offset += table.num_rows
+    finally:
+        src.close()
+    if offset == 0:
+        report.note('no data rows', ERROR, '')
+    elif first_doses == 0:
+        # sin 1ras dosis la adherencia no esta definida
+        report.note('no 1st doses', WARNING, 'dosis')
+    if hashes:
+        # filas identicas; la primera aparicion no se marca
+        duplicated = pd.Series(np.concatenate(hashes)).duplicated().to_numpy()
+        report.add('duplicate row', WARNING, '', np.flatnonzero(duplicated))
+    return report.frame()
+
+
+def has_errors(report):
+    return bool((report.severity == ERROR).any())
+
+
+def summary(report, max_rows=10):
+    # reporte para mostrar: filas como numero de linea del archivo (encabezado = linea 1)
+    out = report.drop(columns='rows').copy()
+    out['lines'] = [', '.join(str(i + 2) for i in rows[:max_rows]) + (' ...' if len(rows) > max_rows else '') for rows in report.rows]
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Validate D4D files and print a violation report')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--reference', default=str(REFERENCE))
+    args = parser.parse_args(argv)
+    failed = 0
+    for path in args.paths:
+        report = validate(path, args.reference)
+        failed += has_errors(report)
+        print(f'{path}: ' + ('OK' if report.empty else f'{len(report)} issue(s)'))
+        if not report.empty:
+            print(summary(report).to_string(index=False))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
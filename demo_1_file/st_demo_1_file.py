@@ -1,12 +1,21 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-import datetime
-from dateutil.relativedelta import relativedelta
+import sys
+import time
+from pathlib import Path
 
+# cada rerun vuelve a ejecutar el script: se agrega la raiz una sola vez
+if str(Path(__file__).resolve().parents[1]) not in sys.path:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+from d4d.data import load_d4d
+from d4d.hyper import load_hyper
+from d4d import precompute
+from d4d.ingest import PREVIEW_ROWS, STREAM_MIN_BYTES, iter_batches
+from d4d.table import paged_table
+from d4d.validate import has_errors, summary
+from d4d.profiling import checkpoint, end_rerun, start_rerun
+
+start_rerun('upload')
 st.set_page_config(layout="wide")
 
 st.write(
@@ -44,8 +53,83 @@ st.header('Consolidated Monthly Data to access to the 3% of discount')
 
 if file is None:
     st.warning('Upload a file')
+    end_rerun()
     st.stop()  
 else:
-    df = pd.read_csv(file,encoding='latin-1',sep=';')
+    # extractos de Tableau (.hyper) se leen con la API de Hyper; el resto como archivo D4D
+    load = load_hyper if file.name.lower().endswith('.hyper') else load_d4d
+    # archivos grandes: lectura por bloques, sin armar el frame completo en memoria
+    streaming = load is load_d4d and st.sidebar.toggle('Streaming ingest (large files)', value=file.size > STREAM_MIN_BYTES)
+    # validacion, guardado en el store y precomputo de analytics y simulator en segundo plano (d4d/precompute.py),
+    # una vez por archivo subido; la pagina muestra los datos mientras tanto
+    if st.session_state.get('ingested_file') != (file.file_id, streaming):
+        st.session_state['precompute'] = precompute.start(file, hyper=load is load_hyper, streaming=streaming)
+        st.session_state['ingested_file'] = (file.file_id, streaming)
+    job = st.session_state['precompute']
+    checkpoint('ingest')
+
+    ### ESTADO DEL PRECOMPUTO ###
+    # la pagina se dibuja una vez con el estado actual y, mientras el job corre, se vuelve a ejecutar cada POLL
+    # segundos (st.rerun al final): el script nunca queda bloqueado esperando al job
+    running = not job.done.is_set()
+    if running:
+        done, stages = job.progress()
+        rows = f' ({job.rows:,} rows read)' if job.rows else ''
+        st.progress(done, text=f'Preparing analytics and simulator: {", ".join(stages)}{rows}' if stages else 'Preparing analytics and simulator...')
+    report = job.report
+    invalid = report is not None and has_errors(report)
+    if invalid:
+        st.error('The file has errors and was not stored. Fix the rows below and upload it again.')
+        st.dataframe(summary(report), hide_index=True, use_container_width=True)
+    elif not running:
+        if not job.stored:
+            st.error(f'The file could not be stored: {job.error}')
+        else:
+            if report is not None and not report.empty:
+                with st.expander(f'{len(report)} data quality warning(s)'):
+                    st.dataframe(summary(report), hide_index=True, use_container_width=True)
+            added = job.added
+            st.success(f"{sum(added.values())} new rows stored for {len(added)} month(s)")
+            if job.error is not None:
+                st.warning(f'Some precomputed results failed and will be built when a page needs them: {job.error}')
+    checkpoint('precompute')
+
+    ### VISTA PREVIA ###
+    # solo de archivos ya validados (los .hyper no se validan): un archivo con errores no se vuelve a leer aqui
     st.subheader('Data Sell Out Gardasil 9')
-    st.write(df, use_container_width=True)
+    if invalid:
+        st.info('No preview: the file has errors.')
+    elif job.stages['validate'] not in ('done', 'skipped'):
+        st.info('Validating the file...')
+    else:
+        try:
+            if streaming:
+                # vista previa del primer bloque, sin esperar la lectura completa; se lee una vez por archivo
+                cached = st.session_state.get('upload_preview')
+                if job.preview is not None:
+                    head = job.preview
+                elif cached is not None and cached[0] == job.key:
+                    head = cached[1]
+                else:
+                    batches = iter_batches(file)
+                    try:
+                        head = next(batches)[0].slice(0, PREVIEW_ROWS).to_pandas()
+                    finally:
+                        batches.close()
+                    st.session_state['upload_preview'] = (job.key, head)
+                st.caption(f'Showing the first {PREVIEW_ROWS:,} rows')
+                st.dataframe(head, use_container_width=True)
+            elif job.parsed.is_set() or not running:
+                # el job ya leyo el archivo: load lo saca del cache en vez de parsearlo en paralelo
+                paged_table(load(file), key='upload')
+            else:
+                st.info('Reading the file...')
+        except Exception as e:
+            st.warning(f'The file could not be previewed: {e}')
+    checkpoint('table')
+    with st.sidebar.expander('Precompute status'):
+        st.dataframe(job.status(), hide_index=True, use_container_width=True)
+    end_rerun()
+    if running:
+        time.sleep(precompute.POLL)
+        st.rerun()
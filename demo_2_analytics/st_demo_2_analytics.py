@@ -2,6 +2,20 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import sys
+from pathlib import Path
+
+# cada rerun vuelve a ejecutar el script: se agrega la raiz una sola vez
+if str(Path(__file__).resolve().parents[1]) not in sys.path:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+from d4d import precompute, sql
+from d4d.cube import load_cube, rollup
+from d4d.benchmark import benchmark_table, load_benchmark
+from d4d.forecast import load_forecast, recommended_units
+from d4d.figures import df_charts
+from d4d.profiling import checkpoint, end_rerun, start_rerun
+
+start_rerun('analytics')
 
 ### DISENO ###
 st.set_page_config(layout="wide")
@@ -33,49 +47,30 @@ st.markdown(hide_decoration_bar_style, unsafe_allow_html=True)
 
 fig_palette =  ['#00857C', '#6ECEB2', '#0C2340', '#BFED33', '#FFF063', '#69B8F7', '#688CE8', '#5450E4']
 
-# st.header('Analytics & Recommendations')
-st.header('Analytics')
+st.header('Analytics & Recommendations')
 
 # tab1, tab2, tab3 = st.tabs(['Your Analytics', 'Regional Analytics', "Recommendations"])
 # tab1 = st.tabs(['Analytics'])
 
 
-### FUNCIONES ###
-def df_clean(df):
-    df.columns = ['fecha', 'especialidad', 'region', 'id_region', 'comuna', 'sexo', 'edad', 'dosis', 'cantidad']
-    df['fecha'] = pd.to_datetime(df.fecha, format='%d-%m-%Y')
-    return df
-
-def df_charts(df, fig_palette):
-    df1 = df.groupby(['sexo','edad']).cantidad.sum().reset_index()
-    fig1 = px.bar(df1, x="edad", y="cantidad", color='sexo', barmode='group',title='Vaccination by age and sex', color_discrete_sequence=fig_palette)
-    df2 = df.groupby('comuna').cantidad.sum().reset_index()
-    fig2 = px.pie(df2, values='cantidad', names='comuna', title='Distribution of districts ', color_discrete_sequence=fig_palette)
-    df3 = df.groupby('especialidad').cantidad.sum().reset_index().sort_values(by='cantidad')
-    fig3 = px.bar(df3, x='cantidad', y='especialidad', title='Specialty prescribers', color_discrete_sequence=fig_palette)
-    df4 = df.groupby('dosis').cantidad.sum().reset_index().sort_values(by='cantidad', ascending=False)
-    fig4 = px.bar(df4, x='dosis', y='cantidad', title='Vaccinated by dose', color_discrete_sequence=fig_palette)
-    return fig1, fig2, fig3, fig4
-
-def df_dosis(df):
-    dosis1_n = df[df.dosis=='1ra'].cantidad.sum()
-    dosis1_p = 1
-    dosis2_n = df[df.dosis=='2da'].cantidad.sum()
-    dosis2_p = dosis2_n/dosis1_n
-    dosis3_n = df[df.dosis=='3ra'].cantidad.sum()
-    dosis3_p = dosis3_n/dosis1_n
-    return dosis1_n, dosis1_p, dosis2_n, dosis2_p, dosis3_n, dosis3_p     
-
-
 ### ANALYTICS ###
 
 # with tab1:
 st.subheader('Your personalized analytics with your own data')
 
-df = pd.read_csv('g9_data_example.csv',encoding='latin-1',sep=';')
-df = df_clean(df)
+# un archivo recien subido se sigue guardando y precomputando en segundo plano: se espera a que termine
+job = st.session_state.get('precompute')
+if not precompute.wait(job, 0):
+    with st.spinner('Preparing the uploaded data...'):
+        precompute.wait(job)
+
+# cubo del store parquet con las cargas D4D, o del archivo de ejemplo si el store esta vacio
+# con D4D_BACKEND=duckdb el cubo del store se agrega con SQL sin cargar los datos
+cube = sql.cube() if sql.enabled() else load_cube('g9_data_example.csv')
+checkpoint('cube')
 
-fig1, fig2, fig3, fig4 = df_charts(df, fig_palette)
+fig1, fig2, fig3, fig4 = df_charts(cube, fig_palette)
+checkpoint('charts')
 
 with st.container():
     col_21, col_22 = st.columns([1,1])
@@ -89,14 +84,26 @@ with st.container():
         st.plotly_chart(fig3 ,use_container_width=True)
     with col_24:
         st.plotly_chart(fig4 ,use_container_width=True)
+checkpoint('render charts')
+
+st.subheader('Regional benchmarking against the national data')
+# percentiles precalculados sobre g9_data_region.csv; tu perfil se ubica con un lookup, sin recorrer el archivo nacional
+bench = load_benchmark('g9_data_region.csv')
+_, region = benchmark_table(bench, cube)
+_ = _.rename(index={'adh2':'Adherence 2nd dose', 'adh3':'Adherence 3rd dose'})
+st.caption(f'Your median month: percentile of its adherence, sex, age and specialty mix among monthly district figures, nationally and in {region}')
+_['Your value']=(_['Your value']*100).round(1).astype(str)+'%'
+for col in ['National percentile', 'Regional percentile']:
+    _[col]=_[col].apply(lambda x: '-' if pd.isna(x) else 'P'+str(int(round(x))))
+st.dataframe(_, use_container_width=True)
+checkpoint('benchmark')
 
 # with tab2:
 #     st.subheader('Regional analytics for benchmarking and opportunities')
 
-#     df = pd.read_csv('g9_data_region.csv',encoding='latin-1',sep=';')
-#     df = df_clean(df)
+#     cube = build_cube(load_d4d('g9_data_region.csv'))
 
-#     fig1, fig2, fig3, fig4 = df_charts(df, fig_palette)
+#     fig1, fig2, fig3, fig4 = df_charts(cube, fig_palette)
 
 #     with st.container():
 #         col_21, col_22 = st.columns([1,1])
@@ -111,24 +118,28 @@ with st.container():
 #         with col_24:
 #             st.plotly_chart(fig4 ,use_container_width=True)
 
-# with tab3:
-#     st.subheader('Purchase recommendation based on historical data')
-#     _ = df.copy()
-#     _['period'] = _.fecha.dt.strftime('%Y-%m') 
-#     _ = _.groupby('period').cantidad.sum().reset_index().rename(columns={'cantidad':'units'})
-#     col_25, col_26 = st.columns(2)
-#     with col_25:
-#         fig5 = px.line(_, x="period", y="units", color_discrete_sequence=fig_palette)
-#         fig5.update_traces(mode='markers+lines')
-#         fig5.update_yaxes(rangemode="tozero")
-#         st.plotly_chart(fig5 ,use_container_width=True)
-#     with col_26:
-#         st.markdown("#")
-#         st.markdown("#")
-#         st.markdown('<div style="font-size:24px"> Based on our records, your historical data and projected demand we recommend you to buy for the current month:</div>', unsafe_allow_html=True)
-#         st.markdown('<div style="text-align:center;font-size:50px;color:#00857C"> <b>18</b></div>', unsafe_allow_html=True)
-#         st.markdown('<div style="text-align:center;font-size:24px"> units</div>', unsafe_allow_html=True)
-#         st.markdown("#")
-#         col_b1, col_b2, col_b3 = st.columns([1,2,1])
-#         with col_b2:
-#             st.link_button("Add it to your shopping cart! :shopping_trolley:", url='https://orders.msdcustomerlink.cl', type='primary', use_container_width=True)
\ No newline at end of file
+st.subheader('Purchase recommendation based on historical data')
+# pronostico desde el store de modelos (d4d/forecast.py): la pagina solo hace el lookup
+forecast = load_forecast(cube)
+mes = forecast.columns[-1]
+units = int(recommended_units(forecast).iloc[0])
+_ = rollup(cube, 'mes').rename(columns={'mes':'period', 'cantidad':'units'})
+col_25, col_26 = st.columns(2)
+with col_25:
+    fig5 = px.line(_, x="period", y="units", color_discrete_sequence=fig_palette)
+    fig5.update_traces(mode='markers+lines')
+    fig5.add_scatter(x=[mes], y=[forecast[mes].iloc[0]], mode='markers', name='Forecast', marker=dict(color=fig_palette[3], size=10))
+    fig5.update_yaxes(rangemode="tozero")
+    st.plotly_chart(fig5 ,use_container_width=True)
+with col_26:
+    st.markdown("#")
+    st.markdown("#")
+    st.markdown('<div style="font-size:24px"> Based on our records, your historical data and projected demand we recommend you to buy for the current month:</div>', unsafe_allow_html=True)
+    st.markdown(f'<div style="text-align:center;font-size:50px;color:#00857C"> <b>{units}</b></div>', unsafe_allow_html=True)
+    st.markdown('<div style="text-align:center;font-size:24px"> units</div>', unsafe_allow_html=True)
+    st.markdown("#")
+    col_b1, col_b2, col_b3 = st.columns([1,2,1])
+    with col_b2:
+        st.link_button("Add it to your shopping cart! :shopping_trolley:", url='https://orders.msdcustomerlink.cl', type='primary', use_container_width=True)
+checkpoint('forecast')
+end_rerun()
@@ -1,12 +1,22 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
-import pandas as pd
-import numpy as np
-import seaborn as sns
 import plotly.express as px
-import plotly.graph_objects as go
-import datetime
-from dateutil.relativedelta import relativedelta
+import sys
+from pathlib import Path
+
+# cada rerun vuelve a ejecutar el script: se agrega la raiz una sola vez
+if str(Path(__file__).resolve().parents[1]) not in sys.path:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+from d4d import precompute, sql
+from d4d.mapped import load_reference
+from d4d.store import load_store
+from d4d.graph import cohorts, dose_counts, economics_tables, fragment, scenario_tables, sensitivity_figures
+from d4d.cube import load_cube
+from d4d.followup import followup_index
+from d4d.table import paged_table
+from d4d.profiling import checkpoint, end_rerun, start_rerun
+
+start_rerun('simulator')
 
 ### DISENO ###
 st.set_page_config(layout="wide")
@@ -43,43 +53,34 @@ st.header('Financial Simulator & Adherence Tools')
 #tab1, tab2, tab3 = st.tabs(['Financial Simulator', "Adherence Tools", "Credit Notes"])
 tab1, tab2 = st.tabs(['Financial Simulator', "Adherence Tools"])
 
-### FUNCIONES ###
-def df_clean(df):
-    df.columns = ['fecha', 'especialidad', 'region', 'id_region', 'comuna', 'sexo', 'edad', 'dosis', 'cantidad']
-    df['fecha'] = pd.to_datetime(df.fecha, format='%d-%m-%Y')
-    return df
-
-def df_dosis(df):
-    dosis1_n = df[df.dosis=='1ra'].cantidad.sum()
-    dosis1_p = 1
-    dosis2_n = df[df.dosis=='2da'].cantidad.sum()
-    dosis2_p = dosis2_n/dosis1_n
-    dosis3_n = df[df.dosis=='3ra'].cantidad.sum()
-    dosis3_p = dosis3_n/dosis1_n
-    return dosis1_n, dosis1_p, dosis2_n, dosis2_p, dosis3_n, dosis3_p     
-
-
 ### SIMULATOR ###
 
-df = pd.read_csv('g9_data_example.csv',encoding='latin-1',sep=';')
-df = df_clean(df)
-
-with tab1:
-    st.subheader('Revenue simulator base on change in adhrence')
-    dosis1_n, dosis1_p, dosis2_n, dosis2_p, dosis3_n, dosis3_p = df_dosis(df)      
-    st.subheader(':gray[Estimated adherence]')
-
-    # KPIS
-    with st.container():
-        col3, col4, col5 = st.columns(3)
-        with col3:
-            st.metric(label="1st dose", delta=str(dosis1_n)+' vaccinated', value=f"{dosis1_p:.0%}")
-        with col4:
-            st.metric(label="2nd dose", delta=str(dosis2_n)+' vaccinated', value=f"{dosis2_p:.0%}")
-        with col5:
-            st.metric(label="3rd dose", delta=str(dosis3_n)+' vaccinated', value=f"{dosis3_p:.0%}")
-        st.write("---")
-        
+# un archivo recien subido se sigue guardando y precomputando en segundo plano: se espera a que termine
+job = st.session_state.get('precompute')
+if not precompute.wait(job, 0):
+    with st.spinner('Preparing the uploaded data...'):
+        precompute.wait(job)
+
+# con D4D_BACKEND=duckdb los conteos y listas de seguimiento se consultan al store sin cargarlo en memoria
+if sql.enabled():
+    df = None
+    dosis = sql.dose_counts()
+    seguimiento = sql.SqlFollowUp()
+else:
+    df = load_store()
+    if df is None:
+        df = load_reference('g9_data_example.csv')
+    dosis = dose_counts(df)
+    # indice por mes de vencimiento (d4d/followup.py): cambiar de periodo es un searchsorted
+    seguimiento = followup_index(df)
+checkpoint('load')
+
+### SIMULADOR ###
+# los inputs viven en un fragment: cambiar precio, costo, descuento o metas solo recalcula los nodos
+# de d4d/graph.py que dependen de ese input (economia -> escenarios -> tablas)
+@fragment
+def simulator(dosis):
+    dosis1_n, dosis1_p, dosis2_n, dosis2_p, dosis3_n, dosis3_p = dosis
     # CALCULADORA###
     with st.container():
         st.subheader(':gray[Simulator]')
@@ -95,88 +96,119 @@ with tab1:
             adh2 = float(adh2.strip('%'))/100
             adh3 = st.text_input('Adherence goal 3rd dose', value='70%', help='Enter adherence target in third dose')
             adh3 = float(adh3.strip('%'))/100
+    economics, costs = economics_tables(precio, costo, dcto)
+    current, potential, opportunity = scenario_tables(dosis, precio, costo, dcto, adh2, adh3)
+    checkpoint('simulator')
     with st.container():
         col_33, col_34 = st.columns(2)
         with col_33:
-            _ = pd.DataFrame.from_dict({
-                'Price':[precio, precio/precio],
-                'Tax':[precio*.19, .19],
-                'Cost':[costo, costo/precio]
-                }, columns = ['CLP', '%'], orient='index')
-            _['%']=(_['%']*100).round(1).astype(str)+'%' 
-            _['CLP']=_['CLP'].apply(lambda x: '{:,}'.format(int(x)))
-            st.dataframe(_, use_container_width=True)
+            st.dataframe(economics, use_container_width=True)
         with col_34:
-            _ = pd.DataFrame.from_dict({
-                'Margin':[precio-precio*.19-costo, (precio-precio*.19-costo)/precio],
-                'Discount':[costo*dcto, dcto],
-                'Post discount margin':[(precio-precio*.19-costo+costo*dcto), (precio-precio*.19-costo+costo*dcto)/precio]
-                }, columns = ['CLP', '%'], orient='index')
-            _['%']=(_['%']*100).round(1).astype(str)+'%' 
-            _['CLP']=_['CLP'].apply(lambda x: '{:,}'.format(int(x)))
-            st.dataframe(_, use_container_width=True)
+            st.dataframe(costs, use_container_width=True)
     with st.container():
         col_35, col_36 = st.columns(2)
         with col_35:
             st.subheader(':gray[Current scenario]')
-            _ = pd.DataFrame.from_dict({
-                'Adherence [%]':[dosis1_p, dosis2_p, dosis3_p],
-                'Sales [doses]':[dosis1_n, dosis2_n, dosis3_n],
-                'Sales [CLP]':[dosis1_n*precio, dosis2_n*precio, dosis3_n*precio],
-                'Margin [CLP]':[(precio-precio*.19-costo+costo*dcto)*dosis1_n, (precio-precio*.19-costo+costo*dcto)*dosis2_n,(precio-precio*.19-costo+costo*dcto)*dosis3_n]
-                }, columns = ['1st dose', '2nd dose', '3rd dose'], orient='index')
-            _.loc['Adherence [%]']=(_.loc['Adherence [%]']*100).round(1).astype(str)+'%'  
-            _.loc['Sales [doses]']=_.loc['Sales [doses]'].apply(lambda x: '{:,}'.format(int(x)))  
-            _.loc['Sales [CLP]']=_.loc['Sales [CLP]'].apply(lambda x: '{:,}'.format(int(x)))  
-            _.loc['Margin [CLP]']=_.loc['Margin [CLP]'].apply(lambda x: '{:,}'.format(int(x)))  
-            st.dataframe(_, use_container_width=True)
+            st.dataframe(current, use_container_width=True)
         with col_36:
             st.subheader(':gray[Potencial scenario]')
-            _ = pd.DataFrame.from_dict({
-                'Adherence [%]':[1, adh2, adh3],
-                'Sales [doses]':[dosis1_n, dosis1_n*adh2, dosis1_n*adh3],
-                'Sales [CLP]':[dosis1_n*precio, dosis1_n*adh2*precio, dosis1_n*adh3*precio],
-                'Margin [CLP]':[(precio-precio*.19-costo+costo*dcto)*dosis1_n, (precio-precio*.19-costo+costo*dcto)*dosis1_n*adh2,(precio-precio*.19-costo+costo*dcto)*dosis1_n*adh3]
-                }, columns = ['1st dose', '2nd dose', '3rd dose'], orient='index')
-            _.loc['Adherence [%]']=(_.loc['Adherence [%]']*100).round(1).astype(str)+'%'  
-            _.loc['Sales [doses]']=_.loc['Sales [doses]'].apply(lambda x: '{:,}'.format(int(x)))  
-            _.loc['Sales [CLP]']=_.loc['Sales [CLP]'].apply(lambda x: '{:,}'.format(int(x)))  
-            _.loc['Margin [CLP]']=_.loc['Margin [CLP]'].apply(lambda x: '{:,}'.format(int(x)))    
-            st.dataframe(_, use_container_width=True)
+            st.dataframe(potential, use_container_width=True)
         with st.container():
             st.subheader(':gray[Income Opportunity]')
-            _ = pd.DataFrame.from_dict({
-                'Sales [doses]':[dosis1_n+dosis2_n+dosis3_n, dosis1_n+dosis1_n*adh2+dosis1_n*adh3, ((dosis1_n+dosis1_n*adh2+dosis1_n*adh3)-(dosis1_n+dosis2_n+dosis3_n))],
-                'Sales [CLP]':[(dosis1_n+dosis2_n+dosis3_n)*precio, (dosis1_n+dosis1_n*adh2+dosis1_n*adh3)*precio,  ((dosis1_n+dosis1_n*adh2+dosis1_n*adh3)-(dosis1_n+dosis2_n+dosis3_n))*precio],
-                'Margin [CLP]':[(dosis1_n+dosis2_n+dosis3_n)*(precio-precio*.19-costo+costo*dcto), (dosis1_n+dosis1_n*adh2+dosis1_n*adh3)*(precio-precio*.19-costo+costo*dcto),((dosis1_n+dosis1_n*adh2+dosis1_n*adh3)-(dosis1_n+dosis2_n+dosis3_n))*(precio-precio*.19-costo+costo*dcto)]
-                }, columns = ['Current', 'Potencial', 'Opportunity'], orient='index')  
-            _.loc['Sales [doses]']=_.loc['Sales [doses]'].apply(lambda x: '{:,}'.format(int(x)))  
-            _.loc['Sales [CLP]']=_.loc['Sales [CLP]'].apply(lambda x: '{:,}'.format(int(x)))  
-            _.loc['Margin [CLP]']=_.loc['Margin [CLP]'].apply(lambda x: '{:,}'.format(int(x)))              
-            st.dataframe(_, use_container_width=True)
+            st.dataframe(opportunity, use_container_width=True)
+            checkpoint('tables')
+            # modo estocastico: adherencia y demanda muestreadas de distribuciones ajustadas al historico
+            if st.toggle('Stochastic mode', help='Draw adherence and demand from distributions fitted to your historical data and show P10/P50/P90 bands'):
+                col_39, col_40 = st.columns(2)
+                with col_39:
+                    trials = st.number_input('Trials', min_value=1000, max_value=2000000, value=100000, step=10000)
+                with col_40:
+                    seed = st.number_input('Seed', min_value=0, value=42, step=1, help='Same seed, same results')
+                # import diferido: solo se carga si se activa el modo estocastico
+                from d4d.montecarlo import history, scenario_bands
+                # mismo origen que las tablas deterministas: el store via duckdb si esta activado
+                cube = sql.cube() if sql.enabled() else load_cube('g9_data_example.csv')
+                _ = scenario_bands(history(cube), precio, costo, dcto, adh2, adh3, trials=int(trials), seed=int(seed))
+                _ = _.applymap(lambda x: '{:,}'.format(int(x)))
+                st.dataframe(_, use_container_width=True)
+                checkpoint('stochastic')
+        with st.container():
+            st.subheader(':gray[Sensitivity]')
+            col_37, col_38 = st.columns(2)
+            fig5, fig6 = sensitivity_figures((dosis1_n, dosis2_n, dosis3_n), precio, costo, dcto, tuple(fig_palette))
+            with col_37:
+                st.plotly_chart(fig5, use_container_width=True)
+            with col_38:
+                st.plotly_chart(fig6, use_container_width=True)
+            checkpoint('sensitivity')
 
         st.write("---")
 
+
+with tab1:
+    st.subheader('Revenue simulator base on change in adhrence')
+    dosis1_n, dosis1_p, dosis2_n, dosis2_p, dosis3_n, dosis3_p = dosis      
+    st.subheader(':gray[Estimated adherence]')
+
+    # KPIS
+    with st.container():
+        col3, col4, col5 = st.columns(3)
+        with col3:
+            st.metric(label="1st dose", delta=str(dosis1_n)+' vaccinated', value=f"{dosis1_p:.0%}")
+        with col4:
+            st.metric(label="2nd dose", delta=str(dosis2_n)+' vaccinated', value=f"{dosis2_p:.0%}")
+        with col5:
+            st.metric(label="3rd dose", delta=str(dosis3_n)+' vaccinated', value=f"{dosis3_p:.0%}")
+        st.write("---")
+    simulator(dosis)
+
 with tab2:
     # col1, col2 = st.columns(2, gap='large')
     # with col1:
         ### SEGUIMIENTO ###
     st.subheader('Tracking - Detail of next doses')
     
-    list_periodos = (df.fecha.apply(lambda x: x+relativedelta(months=2)).dt.strftime('%Y%m')).unique()
-    list_periodos[::-1].sort()
-    periodo = st.selectbox('Choose period to consult ',list_periodos)
-    periodo_dt = datetime.date(int(periodo[:4]),int(periodo[4:]),1)
-    # max periodo + 2 meses
+    periodo = st.selectbox('Choose period to consult ',seguimiento.periodos)
+    due = seguimiento.due_rows(df, periodo)
     col12, col13 = st.columns(2)
     with col12:
-        df_seg2 = df[(df.dosis=='1ra')&(df.fecha>=str(periodo_dt-relativedelta(months=2)))&(df.fecha<str(periodo_dt-relativedelta(months=1)))]
+        df_seg2 = due['2nd dose']
         st.metric(label="2nd dose", value=len(df_seg2))
-        st.write(df_seg2)
+        paged_table(df_seg2, key='seg2')
     with col13:
-        df_seg3 = df[(df.dosis=='2da')&(df.fecha>=str(periodo_dt-relativedelta(months=4)))&(df.fecha<str(periodo_dt-relativedelta(months=3)))]
+        df_seg3 = due['3rd dose']
         st.metric(label="3rd dose", value=len(df_seg3))
-        st.write(df_seg3)
+        paged_table(df_seg3, key='seg3')
+    checkpoint('tracking')
+
+    ### COHORTES ###
+    st.write("---")
+    st.subheader('Cohort adherence (modeled estimate)')
+    st.caption('Estimated share of each 1st-dose cohort that received the next dose, by months since the 1st dose. '
+               'The D4D file has no patient ID, so these shares are not measured: each month\'s later doses are attributed '
+               'to earlier cohorts with a lag profile fitted to the aggregate monthly counts, assuming every cohort in the '
+               'selected segment follows the same profile.')
+    col14, col15, col16 = st.columns(3)
+    with col14:
+        dose = st.selectbox('Dose', ['2nd dose', '3rd dose'], key='cohort_dose')
+    cube = sql.cube() if sql.enabled() else load_cube('g9_data_example.csv')
+    dims = {'Region': 'region', 'District': 'comuna', 'Specialty': 'especialidad', 'Sex': 'sexo', 'Age': 'edad'}
+    with col15:
+        dim = st.selectbox('Slice by', ['All'] + list(dims), key='cohort_dim')
+    filters = {}
+    if dim != 'All':
+        with col16:
+            # valores originales (sin nulos): el filtro compara con el mismo tipo de la columna
+            filters[dims[dim]] = st.selectbox(dim, sorted(cube[dims[dim]].dropna().unique()), key='cohort_value')
+    matrix = cohorts(cube, {'2nd dose': '2da', '3rd dose': '3ra'}[dose], **filters)
+    if matrix.empty:
+        st.info('No 1st-dose cohorts for this selection.')
+    else:
+        fig7 = px.imshow(matrix.drop(columns='1st doses')*100, text_auto='.0f', aspect='auto', color_continuous_scale=['#FFFFFF', fig_palette[0]],
+                         labels={'x':'Months since 1st dose', 'y':'Cohort (month of 1st dose)', 'color':'Estimated adherence [%]'})
+        fig7.update_yaxes(type='category')
+        st.plotly_chart(fig7, use_container_width=True)
+    checkpoint('cohorts')
     # with col2:
     #     ### SEGUIMIENTO ###
     #     st.subheader('Scheduling QR')
@@ -186,17 +218,10 @@ with tab2:
     #         st.image('qr.png')       
 
 # with tab3:
+#     from d4d.credit_notes import credit_notes
 #     col3, col4 = st.columns(2, gap='large')
 #     with col3:
-#         _ = df.copy()
-#         _['period'] = _.fecha.dt.strftime('%Y-%m') 
-#         _ = _.groupby('period').cantidad.sum().reset_index().rename(columns={'cantidad':'units'})
-#         _['sellin'] = _.units*89550
-#         _['d4d'] = (_.sellin*3/100).astype(int)
-#         _['rebate'] = (_.sellin*5/100).astype(int)
-#         _['total_cn'] = _.d4d+_.rebate
-#         _ = _.sort_values(by='period', ascending=False)
-#         del _['units']
+#         _ = credit_notes(df).drop(columns=['customer', 'units'])
 #         cn = _.sort_values(by='period').iloc[-1].total_cn
 #         cn = '$ '+'{:,}'.format(cn)   
 #         _ = _.style.apply(lambda x: ['background-color: #E2F5F0' if (i == x.size-1 or i==0) else '' for i in range(x.size)], axis=1)
@@ -214,4 +239,6 @@ with tab2:
 #         st.markdown('<div style="text-align:center;font-size:24px"> This month you are going to receive:</div>', unsafe_allow_html=True)
 #         st.markdown(f'<div style="text-align:center;font-size:50px;color:#00857C"> <b>{cn}</b></div>', unsafe_allow_html=True)
 #         st.markdown('<div style="text-align:center;font-size:24px"> in credit notes for discounts.</div>', unsafe_allow_html=True)
-#         st.markdown("#")
\ No newline at end of file
+#         st.markdown("#")
+
+end_rerun()
\ No newline at end of file
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+import runpy
+from pathlib import Path
+
+# la pagina ejecuta el mismo script que la app individual (demo_1_file/st_demo_1_file.py)
+runpy.run_path(str(Path(__file__).resolve().parents[1] / 'demo_1_file/st_demo_1_file.py'))
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+import streamlit as st
+
+### APP MULTIPAGINA ###
+# las tres demos como paginas de una sola app (pages/): un solo proceso, con los caches de d4d
+# (archivos, cubos, figuras, pronosticos) compartidos entre paginas y sesiones
+#   streamlit run st_d4d_app.py
+st.set_page_config(layout="wide")
+
+hide_decoration_bar_style = '<style> header {visibility: hidden;} </style>'
+st.markdown(hide_decoration_bar_style, unsafe_allow_html=True)
+
+st.header('Gardasil 9 - Data for Discount')
+st.markdown("""
+- **Upload D4D File**: load your monthly D4D file to access the 3% discount.
+- **Analytics**: your vaccination analytics, regional benchmarking and purchase recommendation.
+- **Simulator**: revenue simulator based on adherence goals and tracking of next doses.
+""")
+st.info('Choose a page in the sidebar')
@@ -7,6 +7,12 @@ import plotly.express as px
 import plotly.graph_objects as go
 import datetime
 from dateutil.relativedelta import relativedelta
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from d4d.data import load_d4d
+from d4d.simulator import df_dosis
 
 st.set_page_config(layout="wide")
 
@@ -29,30 +35,17 @@ file = st.sidebar.file_uploader("Elige un archivo")
 
 tab1, tab2, tab3, tab4, tab5 = st.tabs(["Carga archivo D4D", "Analitica y Recomendaciones", "Calculadora Adherencia", "Seguimiento", "Herramientas"])
 
-def df_clean(df):
-    df.columns = ['fecha', 'especialidad', 'region', 'id_region', 'comuna', 'sexo', 'edad', 'dosis', 'cantidad']
-    df['fecha'] = pd.to_datetime(df.fecha, format='%d-%m-%Y')
-    return df
-
 def df_charts(df, fig_palette):
-    df1 = df.groupby(['sexo','edad']).cantidad.sum().reset_index()
+    df1 = df.groupby(['sexo','edad'], observed=True).cantidad.sum().reset_index()
     fig1 = px.bar(df1, x="edad", y="cantidad", color='sexo', barmode='group',title='Vacunacion por sexo y rango etario', color_discrete_sequence=fig_palette)
-    df2 = df.groupby('comuna').cantidad.sum().reset_index()
+    df2 = df.groupby('comuna', observed=True).cantidad.sum().reset_index()
     fig2 = px.pie(df2, values='cantidad', names='comuna', title='Distribucion comunas vacunados', color_discrete_sequence=fig_palette)
-    df3 = df.groupby('especialidad').cantidad.sum().reset_index().sort_values(by='cantidad')
+    df3 = df.groupby('especialidad', observed=True).cantidad.sum().reset_index().sort_values(by='cantidad')
     fig3 = px.bar(df3, x='cantidad', y='especialidad', title='Especialidad prescriptores', color_discrete_sequence=fig_palette)
-    df4 = df.groupby('dosis').cantidad.sum().reset_index().sort_values(by='cantidad')
+    df4 = df.groupby('dosis', observed=True).cantidad.sum().reset_index().sort_values(by='cantidad')
     fig4 = px.bar(df4, x='dosis', y='cantidad', title='Vacunados por dosis', color_discrete_sequence=fig_palette)
     return fig1, fig2, fig3, fig4
 
-def df_dosis(df):
-    dosis1_n = df[df.dosis=='1ra'].cantidad.sum()
-    dosis1_p = 1
-    dosis2_n = df[df.dosis=='2da'].cantidad.sum()
-    dosis2_p = dosis2_n/dosis1_n
-    dosis3_n = df[df.dosis=='3ra'].cantidad.sum()
-    dosis3_p = dosis3_n/dosis1_n
-    return dosis1_n, dosis1_p, dosis2_n, dosis2_p, dosis3_n, dosis3_p       
 
 ### CARGA DE LOS DATOS ###
 with tab1:
@@ -62,10 +55,9 @@ with tab1:
         st.warning('Cargue un archivo de D4D')
         st.stop()
     else:
-        df = pd.read_csv(file,encoding='latin-1',sep=';')
+        df = load_d4d(file)
         st.subheader('Data Sell Out Gardasil 9')
         st.write(df)
-        df = df_clean(df)
 
 ### ANALYTICS AND RECOMMENDATIONS ###
 with tab2:
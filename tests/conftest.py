@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+EXAMPLE = ROOT / 'g9_data_example.csv'
+HEADER = 'Fecha Vacunación;Especialidad Prescribe;Region;id_region;Comuna;Sexo;Rango Etario;Dosis;Cantidad'
+
+
+def d4d_bytes(rows, header=HEADER, encoding='latin-1', sep=';'):
+    # archivo D4D en memoria: rows son tuplas con los 9 campos en el orden del encabezado
+    lines = [header.replace(';', sep)] + [sep.join(str(v) for v in row) for row in rows]
+    return ('\r\n'.join(lines) + '\r\n').encode(encoding)
+
+
+def row(fecha='07-02-2023', dosis='1ra', cantidad=1, comuna='Buin', region='Metropolitana de Santiago', id_region='region_13'):
+    return (fecha, 'Matrona', region, id_region, comuna, 'Femenino', '30-34', dosis, cantidad)
+
+
+@pytest.fixture
+def example():
+    return EXAMPLE
+
+
+@pytest.fixture
+def store(tmp_path):
+    # raiz de store vacia por test
+    return tmp_path / 'store'
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from d4d.benchmark import benchmark_table, build_benchmark
+
+
+def _cube():
+    # una sola comuna: sus meses son toda la distribucion de referencia
+    rng = np.random.default_rng(0)
+    rows = []
+    for mes in pd.period_range('2022-01', periods=15, freq='M').strftime('%Y-%m'):
+        n1 = int(rng.integers(50, 500))
+        for dosis, n in [('1ra', n1), ('2da', int(n1 * rng.uniform(.3, .9)))]:
+            for sexo, share in [('Femenino', rng.uniform(.2, .8)), ('Masculino', None)]:
+                share = share if share is not None else 1 - rows[-1][-1] / max(n, 1)
+                rows.append((mes, 'R', 'A', 'Matrona', sexo, '30-34', dosis, int(round(n * share))))
+    return pd.DataFrame(rows, columns=['mes', 'region', 'comuna', 'especialidad', 'sexo', 'edad', 'dosis', 'cantidad'])
+
+
+def test_clinic_compared_month_to_month():
+    # la clinica es la propia referencia: su mes mediano cae en P50 de cada metrica
+    cube = _cube()
+    table, region = benchmark_table(build_benchmark(cube), cube)
+    assert region == 'R'
+    # metricas que varian entre meses (las constantes no tienen percentil informativo)
+    table = table.loc[['adh2', 'sexo_Femenino', 'sexo_Masculino']]
+    np.testing.assert_allclose(table['National percentile'], 50, atol=1e-6)
+    np.testing.assert_allclose(table['Regional percentile'], 50, atol=1e-6)
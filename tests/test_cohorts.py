@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from d4d.cohorts import MAX_LAG, cohort_matrix, lag_profile
+
+# perfil conocido: 60% de cada cohorte vuelve a los 2 meses y 20% a los 3
+PROFILE = {2: .6, 3: .2}
+MONTHS = pd.period_range('2021-01', periods=24, freq='M').strftime('%Y-%m')
+
+
+def _cube():
+    # cubo agregado sin pacientes: 1ras dosis por mes y comuna, 2das = cohortes anteriores x PROFILE
+    rng = np.random.default_rng(0)
+    rows = []
+    for comuna, scale in [('A', 1000), ('B', 300)]:
+        first = rng.integers(scale // 2, scale * 2, len(MONTHS)) // 10 * 10
+        second = np.zeros(len(MONTHS))
+        for lag, share in PROFILE.items():
+            second[lag:] += first[:-lag] * share
+        for mes, n1, n2 in zip(MONTHS, first, second):
+            for dosis, n in [('1ra', n1), ('2da', n2)]:
+                rows.append((mes, 'R', comuna, 'Matrona', 'Femenino', '30-34', dosis, int(n)))
+    return pd.DataFrame(rows, columns=['mes', 'region', 'comuna', 'especialidad', 'sexo', 'edad', 'dosis', 'cantidad'])
+
+
+def test_lag_profile_recovers_known_lags():
+    rng = np.random.default_rng(1)
+    first = rng.integers(100, 1000, (1, 30)).astype(float)
+    later = np.zeros_like(first)
+    for lag, share in PROFILE.items():
+        later[:, lag:] += first[:, :-lag] * share
+    expected = np.zeros(MAX_LAG['2da'] + 1)
+    expected[list(PROFILE)] = list(PROFILE.values())
+    np.testing.assert_allclose(lag_profile(first, later, MAX_LAG['2da']), expected, atol=1e-9)
+
+
+def test_cohort_shares_recovered():
+    cube = _cube()
+    matrix = cohort_matrix(cube, '2da', by='comuna')
+    # cohortes con el desfase completo observado: 0 antes del mes 2, 60% al mes 2 y 80% desde el mes 3
+    mature = matrix[matrix[MAX_LAG['2da']].notna()]
+    assert len(mature) == 2 * (len(MONTHS) - MAX_LAG['2da'])
+    np.testing.assert_allclose(mature[[0, 1]], 0, atol=1e-6)
+    np.testing.assert_allclose(mature[2], .6, atol=1e-6)
+    np.testing.assert_allclose(mature[list(range(3, MAX_LAG['2da'] + 1))], .8, atol=1e-6)
+    # el tamano de cada cohorte es su total de 1ras dosis
+    first = cube[cube.dosis == '1ra'].groupby('comuna').cantidad.sum()
+    pd.testing.assert_series_equal(matrix['1st doses'].groupby('comuna').sum(), first, check_names=False)
+
+
+def test_unobserved_months_are_nan():
+    matrix = cohort_matrix(_cube(), '2da')
+    last = matrix.index[-1]
+    assert abs(matrix.loc[last, 0]) < 1e-9 and matrix.loc[last, 1:].isna().all()
+
+
+def test_empty_segment_returns_empty_matrix():
+    cube = _cube()
+    for filters in [{'comuna': 'Z'}, {'comuna': [], 'dosis': '2da'}]:
+        matrix = cohort_matrix(cube, '2da', **filters)
+        assert matrix.empty
+        assert list(matrix.columns) == ['1st doses'] + list(range(MAX_LAG['2da'] + 1))
+    assert cohort_matrix(cube, '3ra', by='comuna', comuna='Z').index.names == ['comuna', 'cohort']
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from d4d.cube import DIMS, build_cube, rollup, store_cube, update_cube
+from d4d.data import load_d4d
+from d4d.store import ingest
+
+
+def _with_nulls(example):
+    df = load_d4d(str(example)).copy()
+    df.loc[df.index[::7], 'comuna'] = np.nan
+    df.loc[df.index[::11], 'edad'] = np.nan
+    return df
+
+
+def test_rollups_match_raw_groupby(example):
+    df = _with_nulls(example)
+    cube = build_cube(df)
+    assert cube.cantidad.sum() == df.cantidad.sum()
+    for dim in DIMS:
+        # cada grafico descarta solo los nulos de su propia dimension
+        expected = df.groupby(dim, observed=True).cantidad.sum()
+        got = rollup(cube, dim).set_index(dim).cantidad
+        pd.testing.assert_series_equal(got.sort_index(), expected.sort_index().astype('int64'), check_names=False, check_index_type=False)
+
+
+def test_dose_totals_keep_rows_with_null_dimensions(example):
+    df = _with_nulls(example)
+    assert rollup(build_cube(df), 'dosis').cantidad.sum() == df.cantidad.sum()
+
+
+def test_store_cube_matches_build_cube(example, store):
+    df = _with_nulls(example)
+    ingest(df, store)
+    got = rollup(store_cube(store), ['mes', 'dosis'])
+    expected = rollup(build_cube(df), ['mes', 'dosis'])
+    key = ['mes', 'dosis']
+    pd.testing.assert_frame_equal(got.astype({k: str for k in key}).sort_values(key).reset_index(drop=True),
+                                  expected.astype({k: str for k in key}).sort_values(key).reset_index(drop=True))
+    assert rollup(store_cube(store), 'comuna').cantidad.sum() == df.dropna(subset=['comuna']).cantidad.sum()
+
+
+def test_update_cube_replaces_only_new_months(example):
+    df = load_d4d(str(example))
+    cube = build_cube(df[df.fecha < '2023-01-01'])
+    updated = update_cube(cube, df[df.fecha >= '2023-01-01'])
+    assert updated.cantidad.sum() == df.cantidad.sum()
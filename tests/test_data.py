@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from d4d import data
+from d4d.data import COLUMNS, FrameCache, load_d4d, source_digest
+
+from conftest import d4d_bytes, row
+
+
+def test_load_d4d_typed_and_cached(example):
+    df = load_d4d(str(example))
+    assert list(df.columns) == COLUMNS
+    assert pd.api.types.is_datetime64_any_dtype(df.fecha)
+    assert df.cantidad.dtype == 'int32'
+    assert df.dosis.dtype == 'category'
+    # mismo contenido: mismo frame del cache, sin volver a parsear
+    assert load_d4d(str(example)) is df
+    assert load_d4d(example.read_bytes()) is df
+
+
+def test_frame_cache_evicts_by_bytes():
+    cache = FrameCache(max_bytes=100, sizeof=lambda df: 40)
+    for key in 'abc':
+        cache.put(key, pd.DataFrame())
+    assert cache.get('a') is None
+    assert cache.get('b') is not None and cache.get('c') is not None
+    assert cache.nbytes == 80
+
+
+def test_frame_cache_recently_used_survives():
+    cache = FrameCache(max_bytes=100, sizeof=lambda df: 40)
+    cache.put('a', pd.DataFrame())
+    cache.put('b', pd.DataFrame())
+    cache.get('a')
+    cache.put('c', pd.DataFrame())
+    assert cache.get('a') is not None and cache.get('b') is None
+
+
+def test_path_digests_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(data, 'MAX_DIGESTS', 3)
+    paths = []
+    for i in range(5):
+        paths.append(tmp_path / f'f{i}.csv')
+        paths[-1].write_bytes(d4d_bytes([row(cantidad=i + 1)]))
+        source_digest(str(paths[-1]))
+    assert len(data._digests) <= 3
+    assert str(paths[-1]) in data._digests and str(paths[0]) not in data._digests
+    # una ruta olvidada se vuelve a hashear con el mismo resultado
+    assert source_digest(str(paths[0])) == data.file_digest(paths[0].read_bytes())
+
+
+def test_frame_cache_max_entries():
+    cache = FrameCache(max_bytes=None, max_entries=2)
+    for key in 'abc':
+        cache.put(key, object())
+    assert cache.get('a') is None and cache.get('c') is not None
+    assert len(cache.frames) == 2
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+
+from d4d import figures
+from d4d.cube import build_cube
+from d4d.data import load_d4d
+from d4d.figures import OTHER, TOP_N, df_charts, top_n
+
+PALETTE = ['#00857C', '#6ECEB2', '#0C2340', '#BFED33']
+
+
+def _wide_cube(n=300):
+    # cubo nacional sintetico: cientos de comunas, especialidades y tramos de edad
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'fecha': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 365, 5000), unit='D'),
+        'region': 'R', 'id_region': 'r',
+        'comuna': [f'c{i}' for i in rng.integers(0, n, 5000)],
+        'especialidad': [f'e{i}' for i in rng.integers(0, 60, 5000)],
+        'sexo': rng.choice(['Femenino', 'Masculino'], 5000),
+        'edad': [f'{i}-{i + 4}' for i in rng.integers(0, 40, 5000) * 5],
+        'dosis': rng.choice(['1ra', '2da', '3ra'], 5000),
+        'cantidad': rng.integers(1, 5, 5000),
+    })
+    for col in ['region', 'id_region', 'comuna', 'especialidad', 'sexo', 'edad', 'dosis']:
+        df[col] = df[col].astype('category')
+    return build_cube(df), df.cantidad.sum()
+
+
+def test_top_n_keeps_total_and_other_bucket():
+    cube, total = _wide_cube()
+    df = top_n(figures.rollup(cube, 'comuna'), 'comuna')
+    assert len(df) == TOP_N and OTHER in set(df.comuna)
+    assert df.cantidad.sum() == total
+
+
+def test_chart_payload_bounded_by_top_n():
+    cube, total = _wide_cube()
+    for fig in df_charts(cube, PALETTE):
+        points = sum(len(trace.values if trace.type == 'pie' else trace.x) for trace in fig.data)
+        traces = len(fig.data)
+        assert points <= TOP_N * max(traces, 1)
+        values = sum(np.sum(trace.values if trace.type == 'pie' else (trace.x if trace.orientation == 'h' else trace.y)) for trace in fig.data)
+        assert values == total
+
+
+def test_figures_cached_by_content(example):
+    cube = build_cube(load_d4d(str(example)))
+    figs = df_charts(cube, PALETTE)
+    assert df_charts(cube.copy(), PALETTE) is figs
+    assert df_charts(cube, PALETTE[::-1]) is not figs
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import gc
+import weakref
+
+from d4d import data
+from d4d.data import load_d4d
+from d4d.followup import NEXT_DOSE, followup_index, month_number, periodo_to_month
+
+
+def test_due_rows_match_filter(example):
+    df = load_d4d(str(example))
+    index = followup_index(df)
+    months = month_number(df.fecha)
+    for periodo in index.periodos[:6]:
+        due = index.due_rows(df, periodo)
+        for name, (dosis, lag) in NEXT_DOSE.items():
+            expected = df[(df.dosis == dosis).to_numpy() & (months + lag == periodo_to_month(periodo))]
+            assert sorted(due[name].index) == sorted(expected.index)
+
+
+def test_index_does_not_keep_frame_alive(example):
+    df = load_d4d(str(example)).copy()
+    followup_index(df)
+    assert followup_index(df) is followup_index(df)
+    ref = weakref.ref(df)
+    key = (id(df), 'followup')
+    del df
+    gc.collect()
+    assert ref() is None
+    assert key not in data._derived
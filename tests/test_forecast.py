@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from d4d import forecast
+from d4d.cube import build_cube
+from d4d.data import load_d4d
+from d4d.forecast import fit_forecast, load_forecast, monthly_matrix, recommended_units
+
+
+def _cube(example):
+    return build_cube(load_d4d(str(example)))
+
+
+def test_monthly_matrix_fills_missing_months(example):
+    wide = monthly_matrix(_cube(example))
+    months = pd.period_range(wide.columns[0], wide.columns[-1], freq='M').strftime('%Y-%m')
+    assert list(wide.columns) == list(months)
+    assert wide.to_numpy().sum() == load_d4d(str(example)).cantidad.sum()
+
+
+def test_same_data_same_model_file(example, tmp_path, monkeypatch):
+    monkeypatch.setattr(forecast, '_forecasts', forecast.FrameCache())
+    cube = _cube(example)
+    # mismo contenido con otro orden y otros tipos: un solo modelo en disco
+    shuffled = cube.sample(frac=1, random_state=0).reset_index(drop=True)
+    shuffled = shuffled.astype({c: str for c in ['mes', 'region', 'comuna']})
+    a = load_forecast(cube, model_dir=tmp_path)
+    b = load_forecast(shuffled, model_dir=tmp_path)
+    assert len(list(tmp_path.glob('forecast-*.parquet'))) == 1
+    pd.testing.assert_frame_equal(a, b)
+    pd.testing.assert_frame_equal(a, fit_forecast(monthly_matrix(cube)))
+    assert recommended_units(a).iloc[0] >= 0
+
+
+def test_old_models_pruned(example, tmp_path, monkeypatch):
+    monkeypatch.setattr(forecast, 'MAX_MODELS', 2)
+    monkeypatch.setattr(forecast, '_forecasts', forecast.FrameCache())
+    cube = _cube(example)
+    for horizon in (1, 2, 3):
+        load_forecast(cube, horizon=horizon, model_dir=tmp_path)
+    files = sorted(p.name for p in tmp_path.glob('forecast-*.parquet'))
+    assert len(files) == 2 and not any(name.endswith('-1.parquet') for name in files)
+
+
+def test_model_version_in_key(example, tmp_path, monkeypatch):
+    monkeypatch.setattr(forecast, '_forecasts', forecast.FrameCache())
+    cube = _cube(example)
+    load_forecast(cube, model_dir=tmp_path)
+    monkeypatch.setattr(forecast, 'MODEL_VERSION', forecast.MODEL_VERSION + 1)
+    load_forecast(cube, model_dir=tmp_path)
+    assert len(list(tmp_path.glob(f'forecast-v{forecast.MODEL_VERSION}-*.parquet'))) == 1
+    assert len(list(tmp_path.glob('forecast-*.parquet'))) == 2
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import datetime
+import io
+
+import pandas as pd
+
+from d4d.data import COLUMNS, open_d4d, parse_d4d
+from d4d.formats import SAMPLE_BYTES, sniff_encoding
+from d4d.ingest import iter_batches
+from d4d.validate import has_errors, validate
+
+from conftest import d4d_bytes, row
+
+# encabezado sin tildes: la muestra inicial puede ser ASCII puro
+ASCII_HEADER = ';'.join(COLUMNS)
+
+
+def _late_accent(encoding):
+    # primeras filas ASCII (mas que la muestra) y la primera comuna con tildes al final
+    rows = [row()] * (2 * SAMPLE_BYTES // 60) + [row(comuna='Ñuñoa')]
+    return d4d_bytes(rows, header=ASCII_HEADER, encoding=encoding)
+
+
+def test_latin1_after_ascii_sample():
+    data = _late_accent('latin-1')
+    assert open_d4d(data).encoding != 'utf-8'
+    df = parse_d4d(data)
+    assert df.comuna.iloc[-1] == 'Ñuñoa'
+    streamed = pd.concat(t.to_pandas() for t, _ in iter_batches(data, block_size=16 * 1024))
+    assert streamed.comuna.iloc[-1] == 'Ñuñoa' and len(streamed) == len(df)
+    assert not has_errors(validate(data))
+
+
+def test_utf8_after_ascii_sample():
+    df = parse_d4d(_late_accent('utf-8'))
+    assert df.comuna.iloc[-1] == 'Ñuñoa'
+
+
+def test_small_files_sniffed_exactly():
+    assert sniff_encoding('Ñuñoa'.encode('utf-8'), 'latin-1', complete=True) == 'utf-8'
+    assert sniff_encoding('Ñuñoa'.encode('latin-1'), 'latin-1', complete=True) == 'latin-1'
+    assert parse_d4d(d4d_bytes([row(comuna='Ñuñoa')], encoding='utf-8')).comuna.iloc[0] == 'Ñuñoa'
+
+
+def test_excel_dates_and_missing_values():
+    # mismas variantes de fecha que el lector CSV, celdas de fecha de Excel y celdas vacias
+    rows = [row('07-02-2023'), row('07/02/2023'), row('2023-02-07'), row(datetime.datetime(2023, 2, 7), comuna=None)]
+    buf = io.BytesIO()
+    pd.DataFrame(rows, columns=COLUMNS).to_excel(buf, index=False)
+    df = parse_d4d(buf.getvalue())
+    assert (df.fecha == pd.Timestamp('2023-02-07')).all()
+    assert df.comuna.isna().tolist() == [False, False, False, True]
+    assert 'nan' not in df.comuna.cat.categories
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from d4d import mapped as mapped_module
+from d4d.mapped import mapped
+
+
+def test_version_bump_rebuilds_and_prunes(tmp_path, monkeypatch):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return pd.DataFrame({'a': [len(builds)]})
+
+    assert mapped('cube', 'abc', build, tmp_path).a[0] == 1
+    assert mapped('cube', 'abc', build, tmp_path).a[0] == 1 and len(builds) == 1
+    # otra logica de construccion: el artefacto anterior no se vuelve a servir
+    monkeypatch.setattr(mapped_module, 'VERSION', mapped_module.VERSION + 1)
+    assert mapped('cube', 'abc', build, tmp_path).a[0] == 2
+    assert [p.name for p in tmp_path.glob('cube-*.arrow')] == [f'cube-v{mapped_module.VERSION}-abc.arrow']
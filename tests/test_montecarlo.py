@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from d4d import montecarlo
+from d4d.cube import build_cube
+from d4d.data import load_d4d
+from d4d.montecarlo import history, run_trials, scenario_bands
+
+INPUTS = (130000, 89500, .03, .8, .7)
+
+
+def _params(example):
+    return history(build_cube(load_d4d(str(example))))
+
+
+def test_same_seed_same_samples(example):
+    params = _params(example)
+    a = run_trials(params, *INPUTS, trials=30_000, seed=7)
+    b = run_trials(params, *INPUTS, trials=30_000, seed=7)
+    assert a.shape == (2, 3, 30_000)
+    np.testing.assert_array_equal(a, b)
+    assert not np.array_equal(a, run_trials(params, *INPUTS, trials=30_000, seed=8))
+
+
+def test_pool_matches_in_process(example, monkeypatch):
+    # el pool (spawn) usa las mismas semillas por lote que la corrida en el mismo proceso
+    params = _params(example)
+    local = run_trials(params, *INPUTS, trials=30_000, seed=3)
+    monkeypatch.setattr(montecarlo, 'POOL_MIN_TRIALS', 1)
+    try:
+        pooled = run_trials(params, *INPUTS, trials=30_000, seed=3)
+        assert not montecarlo._futures
+    finally:
+        montecarlo.shutdown()
+    np.testing.assert_array_equal(local, pooled)
+
+
+def test_bands_cached_per_scenario(example, monkeypatch):
+    params = _params(example)
+    table = scenario_bands(params, *INPUTS, trials=5_000, seed=1)
+    assert (table.loc['Sales [CLP] P10'] <= table.loc['Sales [CLP] P50']).all()
+    assert (table.loc['Sales [CLP] P50'] <= table.loc['Sales [CLP] P90']).all()
+
+    def resubmitted(*args, **kwargs):
+        raise AssertionError('trials resubmitted for a cached scenario')
+    monkeypatch.setattr(montecarlo, 'run_trials', resubmitted)
+    assert scenario_bands(params, *INPUTS, trials=5_000, seed=1) is table
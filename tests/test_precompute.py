@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def test_import_is_light():
+    # la pagina de carga importa precompute: plotly y scipy solo se cargan al precomputar
+    code = 'import sys, d4d.precompute; print(sorted({"plotly.express", "scipy.optimize"} & set(sys.modules)))'
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == '[]'
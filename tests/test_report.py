@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import base64
+import subprocess
+import sys
+
+from conftest import ROOT
+from d4d.cube import build_cube
+from d4d.data import load_d4d
+from d4d.report import charts, render
+
+
+def test_import_keeps_matplotlib_backend():
+    # importar el modulo (p. ej. desde una app) no fija el backend de matplotlib
+    code = ('import matplotlib; matplotlib.use("svg"); import d4d.report; '
+            'print(matplotlib.get_backend())')
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == 'svg'
+
+
+def test_charts_are_svg(example):
+    out = charts(build_cube(load_d4d(str(example))))
+    assert len(out) == 4
+    assert all(b'<svg' in base64.b64decode(chart) for chart in out)
+
+
+def test_render_html(example, tmp_path):
+    name, paths, _ = render(str(example), tmp_path)
+    assert paths == [str(tmp_path / f'{name}.html')]
+    assert 'Purchase recommendation' in (tmp_path / f'{name}.html').read_text(encoding='utf-8')
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from d4d import sql
+from d4d.cube import build_cube
+from d4d.data import parse_d4d
+from d4d.store import ingest
+
+from conftest import d4d_bytes, row
+
+pytest.importorskip('duckdb')
+
+
+@pytest.fixture
+def memo(monkeypatch):
+    cache = sql.FrameCache(max_bytes=None, max_entries=3)
+    monkeypatch.setattr(sql, '_memo', cache)
+    return cache
+
+
+def test_cube_matches_pandas(store, memo):
+    df = parse_d4d(d4d_bytes([row('03-01-2023'), row('10-01-2023', '2da'), row('02-02-2023', cantidad=3)]))
+    ingest(df, store)
+    got = sql.cube(root=store)
+    assert got.cantidad.sum() == build_cube(df).cantidad.sum() == 5
+    assert sorted(got.mes.astype(str).unique()) == ['2023-01', '2023-02']
+
+
+def test_stale_results_replaced(store, memo):
+    ingest(parse_d4d(d4d_bytes([row('03-01-2023')])), store)
+    assert sql.dose_counts(root=store)[0] == 1
+    assert sql.dose_counts(root=store) is sql.dose_counts(root=store)
+    # una nueva ingesta cambia la huella: se recalcula y reemplaza la entrada anterior
+    ingest(parse_d4d(d4d_bytes([row('04-02-2023', cantidad=4)])), store)
+    assert sql.dose_counts(root=store)[0] == 5
+    assert len(memo.frames) == 1
+
+
+def test_results_bounded(tmp_path, memo):
+    for i in range(5):
+        path = tmp_path / f'{i}.csv'
+        path.write_bytes(d4d_bytes([row(cantidad=i + 1)]))
+        assert sql.dose_counts(str(path))[0] == i + 1
+    assert len(memo.frames) == 3
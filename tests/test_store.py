@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from d4d import store as store_module
+from d4d.data import COLUMNS, parse_d4d
+from d4d.ingest import stream_ingest
+from d4d.store import ingest, list_months, read_store
+
+from conftest import d4d_bytes, row
+
+ROWS = [row('03-01-2023'), row('03-01-2023'), row('10-01-2023', '2da'), row('02-02-2023', cantidad=3)]
+
+
+def _sorted(df):
+    return df[COLUMNS].astype({c: str for c in COLUMNS}).sort_values(COLUMNS).reset_index(drop=True)
+
+
+def test_ingest_partitions_by_month(store):
+    added = ingest(parse_d4d(d4d_bytes(ROWS)), store)
+    assert added == {'2023-01': 3, '2023-02': 1}
+    assert list_months(store) == ['2023-01', '2023-02']
+    assert read_store(root=store).cantidad.sum() == 6
+
+
+def test_reingest_is_idempotent(store):
+    df = parse_d4d(d4d_bytes(ROWS))
+    ingest(df, store)
+    assert ingest(df, store) == {'2023-01': 0, '2023-02': 0}
+    assert len(read_store(root=store)) == len(ROWS)
+
+
+def test_identical_rows_are_a_multiset(store):
+    # las dos filas iguales del primer archivo se conservan; un archivo con tres agrega solo la tercera
+    ingest(parse_d4d(d4d_bytes(ROWS)), store)
+    added = ingest(parse_d4d(d4d_bytes([row('03-01-2023')] * 3)), store)
+    assert added == {'2023-01': 1}
+    assert len(read_store(root=store)) == len(ROWS) + 1
+
+
+def test_stream_ingest_merges_existing_month_like_ingest(store, tmp_path, monkeypatch):
+    # bloques chicos para que la mezcla por bloques recorra varios lotes
+    monkeypatch.setattr(store_module, 'MERGE_BATCH_ROWS', 2)
+    first = d4d_bytes(ROWS)
+    second = d4d_bytes([row('03-01-2023')] * 3 + [row('20-01-2023', '3ra'), row('02-02-2023', cantidad=3)])
+    ingest(parse_d4d(first), store)
+    added, preview = stream_ingest(second, store, block_size=128)
+    assert added == {'2023-01': 2, '2023-02': 0}
+    assert 0 < len(preview) < 5
+    ref = tmp_path / 'ref'
+    ingest(parse_d4d(first), ref)
+    ingest(parse_d4d(second), ref)
+    pd.testing.assert_frame_equal(_sorted(read_store(root=store)), _sorted(read_store(root=ref)))
+    # volver a subir el mismo archivo no agrega nada
+    assert stream_ingest(second, store, block_size=128)[0] == {'2023-01': 0, '2023-02': 0}
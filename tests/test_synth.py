@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from d4d.data import load_d4d
+from d4d.synth import generate, reference_model
+
+
+def test_exact_rows_and_dose_mix(tmp_path):
+    # cada bloque se corta en `rows`: la mezcla de dosis debe seguir la del modelo en todos los bloques
+    path = tmp_path / 'synth.csv'
+    assert generate(path, 30_000, seed=1, chunk_rows=10_000) == 30_000
+    df = load_d4d(str(path))
+    assert len(df) == 30_000
+    model = reference_model()
+    expected = {'1ra': 1, '2da': model['p2'], '3ra': model['p2'] * model['p3']}
+    total = sum(expected.values())
+    for block in range(3):
+        share = df.iloc[block * 10_000:(block + 1) * 10_000].dosis.value_counts(normalize=True)
+        for dosis, weight in expected.items():
+            # algunas dosis caen despues del fin del periodo y se descartan: tolerancia de 20%
+            assert abs(share.get(dosis, 0) - weight / total) < weight / total * .2
+        # sin bloques ordenados por dosis
+        assert df.dosis.iloc[block * 10_000:block * 10_000 + 100].nunique() > 1
+
+
+def test_same_seed_same_file(tmp_path):
+    a, b = tmp_path / 'a.csv', tmp_path / 'b.csv'
+    generate(a, 2_000, seed=3)
+    generate(b, 2_000, seed=3)
+    assert a.read_bytes() == b.read_bytes()
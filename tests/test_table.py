@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import gc
+import weakref
+
+from streamlit.testing.v1 import AppTest
+
+from d4d import data
+from d4d.data import load_d4d
+from d4d.table import page, query, table_key, to_arrow
+
+
+def test_filter_and_sort(example):
+    df = load_d4d(str(example))
+    table = to_arrow(df)
+    rows = query(table, table_key(df), 'comuna', 'BUIN', 'cantidad', False)
+    got = page(table, rows, 1, 1000)
+    assert len(got) == (df.comuna.astype(str).str.lower() == 'buin').sum()
+    assert got.cantidad.is_monotonic_decreasing
+
+
+def test_rebuilt_frames_hit_the_cache(example):
+    # los frames de seguimiento son un iloc nuevo en cada rerun: mismo contenido, misma tabla y consulta
+    df = load_d4d(str(example))
+    a, b = df.iloc[10:60], df.iloc[10:60]
+    assert a is not b
+    assert to_arrow(a) is to_arrow(b)
+    assert query(to_arrow(a), table_key(a), 'comuna', 'u') is query(to_arrow(b), table_key(b), 'comuna', 'u')
+
+
+def test_cache_does_not_keep_frames_alive(example):
+    df = load_d4d(str(example)).iloc[:100]
+    to_arrow(df)
+    ref, key = weakref.ref(df), (id(df), 'digest')
+    del df
+    gc.collect()
+    assert ref() is None
+    assert key not in data._derived
+
+
+# pagina fuera de rango guardada en el estado: se vuelve a la primera sin avisos de streamlit
+APP = """
+import streamlit as st
+from d4d.data import load_d4d
+from d4d.table import paged_table
+st.session_state.setdefault('t_page', 99)
+paged_table(load_d4d({path!r}).iloc[:120], key='t', page_size=50)
+"""
+
+
+def test_page_state_without_widget_warning(example):
+    at = AppTest.from_string(APP.format(path=str(example)), default_timeout=30).run()
+    assert not at.exception and not at.warning
+    assert at.number_input(key='t_page').value == 1
+    at.number_input(key='t_page').set_value(3).run()
+    assert not at.exception and not at.warning
+    assert at.dataframe[0].value.shape[0] == 20
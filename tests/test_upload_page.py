@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from conftest import HEADER, ROOT, d4d_bytes, row
+
+# AppTest no sube archivos: el script reemplaza el file_uploader del sidebar por un UploadedFile con los bytes dados
+APP = """
+import runpy
+import streamlit as st
+from streamlit.proto.Common_pb2 import FileURLs
+from streamlit.runtime.uploaded_file_manager import UploadedFile, UploadedFileRec
+data = {data!r}
+st.sidebar.file_uploader = lambda *args, **kwargs: UploadedFile(UploadedFileRec({name!r}, {name!r}, 'text/csv', data), FileURLs())
+runpy.run_path({page!r})
+"""
+PAGE = str(ROOT / 'demo_1_file' / 'st_demo_1_file.py')
+
+
+def _run(data, name='upload.csv'):
+    at = AppTest.from_string(APP.format(data=data, name=name, page=PAGE), default_timeout=60)
+    return at.run()
+
+
+@pytest.mark.parametrize('data', [
+    d4d_bytes([row(), row(cantidad='x')]),
+    d4d_bytes([row()], header=HEADER + ';Extra'),
+    d4d_bytes([]),
+    b'',
+], ids=['bad int', 'unknown header', 'no rows', 'empty'])
+def test_invalid_upload_does_not_crash(data):
+    at = _run(data, name=f'bad{len(data)}.csv')
+    assert not at.exception
+    assert any('has errors' in e.value for e in at.error)
+    # sin vista previa ni ingesta: solo corre la validacion
+    assert len(at.main.dataframe) == 1 and not at.number_input
+    stages = at.session_state['precompute'].stages
+    assert stages['validate'] == 'done' and stages['store'] == 'skipped'
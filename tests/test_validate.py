@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from d4d.validate import ERROR, WARNING, has_errors, summary, validate
+
+from conftest import HEADER, d4d_bytes, row
+
+
+def _found(report):
+    return {(r.check, r.column): list(r.rows) for r in report.itertuples()}
+
+
+def test_clean_file(example):
+    report = validate(str(example))
+    assert not has_errors(report)
+
+
+def test_row_violations():
+    rows = [
+        row(),
+        row(fecha='31-02-2023'),
+        row(dosis='4ta'),
+        row(cantidad='x'),
+        row(cantidad=-2),
+        row(comuna=''),
+        row(),
+        row(id_region='region_5'),
+    ]
+    report = validate(d4d_bytes(rows))
+    found = _found(report)
+    assert found[('invalid date', 'fecha')] == [1]
+    assert found[('invalid dose', 'dosis')] == [2]
+    assert found[('invalid cantidad', 'cantidad')] == [3]
+    assert found[('negative cantidad', 'cantidad')] == [4]
+    assert found[('missing value', 'comuna')] == [5]
+    # la primera aparicion de una fila repetida no se marca
+    assert found[('duplicate row', '')] == [6]
+    assert found[('region/id_region mismatch', 'id_region')] == [7]
+    assert set(report[report.severity == WARNING].check) == {'duplicate row', 'region/id_region mismatch'}
+    assert has_errors(report)
+    # lineas del archivo: encabezado = linea 1
+    assert summary(report).set_index('check').loc['invalid date', 'lines'] == '3'
+
+
+def test_violations_across_blocks():
+    # filas repetidas y errores en bloques distintos del lector
+    rows = [row()] + [row(cantidad=i + 2) for i in range(400)] + [row(), row(dosis='')]
+    found = _found(validate(d4d_bytes(rows), block_size=1024))
+    assert found[('duplicate row', '')] == [401]
+    assert found[('missing value', 'dosis')] == [402]
+
+
+def test_header_problems():
+    found = _found(validate(d4d_bytes([row()], header=HEADER.replace('Cantidad', 'Total') + ';Extra')))
+    assert ('unknown column', 'Total') in found and ('unknown column', 'Extra') in found
+    assert ('missing column', 'cantidad') in found
+
+
+def test_empty_file_and_no_first_doses():
+    report = validate(d4d_bytes([]))
+    assert list(report.check) == ['no data rows'] and report.severity[0] == ERROR
+    found = _found(validate(d4d_bytes([row(dosis='2da')])))
+    assert ('no 1st doses', 'dosis') in found
+
+
+def test_malformed_rows_reported():
+    data = d4d_bytes([row()]) + b'07-02-2023;Matrona\r\n'
+    report = validate(data)
+    assert 'malformed row' in set(report.check)
+    assert np.array_equal(report[report.check == 'malformed row'].n, [1])